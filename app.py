@@ -1,93 +1,168 @@
-from flask import Flask, render_template, request, jsonify, flash, url_for, redirect, session
+from flask import Flask, render_template, request, jsonify, flash, url_for, redirect, session, stream_with_context, g
+from flask import before_render_template, template_rendered
 import mysql.connector
-from datetime import datetime
-from functools import wraps
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import faiss
-import numpy as np
-import json
+from datetime import datetime, date
+from functools import partial, wraps
 import logging
 import mysql
+import time
+
+from settings import DB_SETTINGS, POOL_SETTINGS, REPLICA_DB_SETTINGS, ROUTING_SETTINGS
+from availability import availability_index, parse_date
+import batch_booking
+from booking import BookingRejected, book, is_retryable, with_lock_retry
+import bulk_import
+from chat_generator import Token, answer_generator
+from chat_server import ChatServerError, chat_server_client
+from catalogue_cache import catalogue_cache
+from db_pool import ConnectionPool, PoolTimeout
+from db_routing import REPLICA, ReplicaRouter
+from listings import (CARS_BY_ID_SQL, CARS_SQL, CAR_KEYSET_NEWEST, CUSTOMERS_BY_ID_SQL, CUSTOMERS_SQL,
+                      CUSTOMER_KEYSET, RENTAL_DETAILS_SQL, RENTAL_HISTORY_KEYSET, SEARCH_FILTERS,
+                      rentals_by_party_query)
+from metrics import metrics
+from overdue import ACTIONS as OVERDUE_ACTIONS, complete_rentals, overdue_scheduler, release_cars
+from pagination import PageRequest, fetch_page, stream_rows
+from quote_engine import MAX_DAYS, MAX_RANGES, quote_engine
+from rental_export import ExportRequest, stream_export
+from rental_stats import rental_stats
+from search_index import search_indexes
+from chatbot import chat_models, response_cache, search_batcher, chat_reply, chat_state, stream_response, WARMUP_MODE
 
 app = Flask(__name__)
 app.secret_key = 'qwertyuiop'
 
-# Database configuration
-db_config = {
-    "pool_name": "mypool",
-    "pool_size": 5,
-    "host": "localhost",
-    "user": "root",
-    "password": "12345",
-    "database": "car_rental"
-}
-
-# Create connection pool
-connection_pool = mysql.connector.pooling.MySQLConnectionPool(**db_config)
-
-
-# Load Q&A knowledge base
-try:
-    with open("combined_knowledge_base.json", "r") as f:
-        knowledge_data = json.load(f)
-    
-    if not isinstance(knowledge_data, list):
-        raise ValueError("Knowledge base must be a list of question-answer pairs")
-    
-    questions = [item["question"] for item in knowledge_data]
-    answers = [item["answer"] for item in knowledge_data]
-except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-    logging.error(f"Error loading knowledge base: {str(e)}")
-    questions = []
-    answers = []
-
-# Load embedding model
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-question_embeddings = embedder.encode(questions)
-
-# Build FAISS index
-index = faiss.IndexFlatL2(question_embeddings.shape[1])
-index.add(np.array(question_embeddings))
-
-# Load DistilGPT2
-tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
-model = AutoModelForCausalLM.from_pretrained("distilgpt2")
-
-# RAG pipeline
-def get_context(user_input):
-    user_embedding = embedder.encode([user_input])
-    distances, indices = index.search(np.array(user_embedding), k=1)
-    
-    # Add distance threshold to ensure relevant matches
-    if distances[0][0] < 2.0:  # Adjust threshold as needed
-        return answers[indices[0][0]]
-    return None
-
-def generate_response(user_input):
-    context = get_context(user_input)
-    
-    if context:
-        response = f"{context}"
-    else:
-        response = "I apologize, but I don't have specific information about that. Please contact our customer service for more detailed assistance."
-    
+# Create connection pool (sized and tuned through POOL_SETTINGS)
+connection_pool = ConnectionPool(lambda: mysql.connector.connect(**DB_SETTINGS), **POOL_SETTINGS)
+replica_pool = None
+if REPLICA_DB_SETTINGS:
+    replica_pool = ConnectionPool(lambda: mysql.connector.connect(**REPLICA_DB_SETTINGS), **POOL_SETTINGS,
+                                  name="replica")
+# Picks the pool for each @db_connection handler (see db_routing.py)
+db_router = ReplicaRouter(connection_pool, replica_pool, **ROUTING_SETTINGS)
+
+# Request, SQL, template and chat timings for /metrics
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request()
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    if response.is_streamed:
+        # Teardown runs when the handler returns, before the server has sent
+        # the body; time a stream until the server closes it instead
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        response.call_on_close(partial(metrics.end_request, route, request.method, response.status_code,
+                                       request.path, metrics.request_started()))
+        g.response_streamed = True
     return response
 
+# Teardown also runs when a handler raises, so unhandled errors are counted
+# as 500s
+@app.teardown_request
+def record_request_metrics(exc):
+    if exc is None and g.get('response_streamed'):
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    metrics.end_request(route, request.method, status, request.path)
+
+before_render_template.connect(lambda sender, **extra: metrics.template_started(), app, weak=False)
+template_rendered.connect(lambda sender, template, **extra: metrics.template_finished(template.name), app, weak=False)
+
+metrics.gauges("db_pool", connection_pool.stats, "Database connection pool", pool=connection_pool.name)
+if replica_pool:
+    metrics.gauges("db_pool", replica_pool.stats, "Database connection pool", pool=replica_pool.name)
+metrics.gauges("db_routing", db_router.stats, "Primary / replica routing")
+metrics.gauges("catalogue_cache", catalogue_cache.stats, "Car catalogue cache")
+if chat_server_client:
+    metrics.gauges("chat_server_client", chat_server_client.stats, "Requests to the shared chat server")
+else:
+    # Only the process that owns the models has anything to report here
+    metrics.gauges("chat_cache", response_cache.stats, "Chat response cache")
+    metrics.gauges("chat_batching", search_batcher.stats, "Batched chat searches")
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Chatbot models load in the background (or on first use) so startup stays fast.
+# With CHAT_SERVER_SOCKET set they live in chat_server.py's process instead
+# and this worker loads nothing.
+if chat_server_client is None:
+    if WARMUP_MODE == 'eager':
+        chat_models.wait_until_ready()
+    elif WARMUP_MODE == 'background':
+        chat_models.start_warmup()
+    chat_models.watch()
+    # Optional distilgpt2 answers (CHAT_GENERATION=1); loads in the background
+    answer_generator.start_warmup()
+
+# Periodic sweep of rentals past their end_date
+overdue_scheduler.start(connection_pool.get_connection)
+
+CHAT_ERROR_RESPONSE = "I apologize, but I encountered an error. Please try again."
+
 # Fix: Remove the duplicate chat route and keep only one
 @app.route("/chat", methods=["POST"])
 def chat():
     user_input = request.json.get("message", "").strip()
     if not user_input:
         return jsonify({"response": "Please ask a question."})
+
+    streaming = request.args.get("stream") == "1" or request.accept_mimetypes.best == "text/event-stream"
+    if chat_server_client:
+        if streaming:
+            return chat_event_stream(chat_server_client.stream(user_input))
+        try:
+            return jsonify(chat_server_client.reply(user_input))
+        except ChatServerError as e:
+            logging.error(f"Chat error: {str(e)}")
+            return jsonify({"response": CHAT_ERROR_RESPONSE})
+
+    if not chat_models.is_ready():
+        return jsonify(chat_reply(user_input))
+
+    if streaming:
+        return chat_event_stream(stream_response(user_input))
     
     try:
-        bot_response = generate_response(user_input)
-        return jsonify({"response": bot_response})
+        return jsonify(chat_reply(user_input))
     except Exception as e:
         logging.error(f"Chat error: {str(e)}")
-        return jsonify({"response": "I apologize, but I encountered an error. Please try again."})
+        return jsonify({"response": CHAT_ERROR_RESPONSE})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+def chat_event_stream(events):
+    return app.response_class(stream_with_context(chat_events(events)), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def chat_events(events):
+    # Server-sent events: 'token' for each piece of generated text, then one
+    # 'done' carrying the full answer. Clients that see source 'retrieval'
+    # should show the done response in place of any tokens received.
+    try:
+        for event in events:
+            if isinstance(event, Token):
+                yield _sse("token", {"text": event.text})
+            else:
+                yield _sse("done", event.as_dict())
+    except Exception as e:
+        logging.error(f"Chat error: {str(e)}")
+        yield _sse("done", {"response": CHAT_ERROR_RESPONSE, "source": "error", "reason": "error"})
+
+@app.route("/chat/status", methods=["GET"])
+def chat_status():
+    if chat_server_client:
+        try:
+            return jsonify({**chat_server_client.state(), "server": chat_server_client.stats()})
+        except ChatServerError as e:
+            return jsonify({"status": "unavailable", "error": str(e), "server": chat_server_client.stats()}), 503
+    return jsonify(chat_state())
 
 # Remove this duplicate route definition
 # @app.route("/chat", methods=["POST"])
@@ -97,13 +172,28 @@ def chat():
 #     return jsonify({"response": bot_response})
 
 # Database connection decorator
-def db_connection(f):
+def db_connection(f=None, read_only=False):
+    # @db_connection(read_only=True) lets the handler run on the replica;
+    # handlers that write keep the bare @db_connection and the primary
+    if f is None:
+        return lambda f: db_connection(f, read_only)
+
     @wraps(f)
     def decorator(*args, **kwargs):
-        conn = connection_pool.get_connection()
+        try:
+            conn, g.db_pool = db_router.connection(read_only, session.get('db_last_write'))
+        except PoolTimeout as e:
+            # Every connection stayed busy for the whole checkout timeout
+            logging.error(f"Database pool exhausted: {str(e)}")
+            response = jsonify({"error": "Server is busy, please try again"})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         cursor = conn.cursor(dictionary=True)
         try:
             result = f(cursor, conn, *args, **kwargs)
+            if replica_pool and not read_only and request.method != 'GET':
+                # Keeps this session's reads on the primary until replicas have caught up
+                session['db_last_write'] = time.time()
             return result
         except Exception as e:
             conn.rollback()
@@ -114,6 +204,34 @@ def db_connection(f):
             conn.close()
     return decorator
 
+def next_page_headers(response, next_cursor):
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        if request.method == 'GET':
+            args = {**request.args.to_dict(), 'cursor': next_cursor}
+            response.headers['Link'] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+def streamed_rows(select_sql, keyset, page, where=None, params=()):
+    # Runs on its own pooled connection once the handler has returned
+    mimetype = 'application/x-ndjson' if page.stream == 'ndjson' else 'application/json'
+    pool = db_router.pool(g.db_pool)
+    rows = stream_rows(pool.get_connection, select_sql, keyset, page, app.json.dumps, where, params)
+    return app.response_class(rows, mimetype=mimetype)
+
+def list_response(cursor, select_sql, keyset, where=None, params=(), args=None):
+    # One keyset page as a JSON array (next cursor in the Link / X-Next-Cursor
+    # headers), or the whole result streamed when ?format=ndjson|json
+    try:
+        page = PageRequest.from_args(request.args if args is None else args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page.stream:
+        return streamed_rows(select_sql, keyset, page, where, params)
+    rows, next_cursor = fetch_page(cursor, select_sql, keyset, page, where, params)
+    return next_page_headers(jsonify(rows), next_cursor)
+
+
 @app.route('/admin')
 def admin_page():
     if not session.get('is_admin'):
@@ -145,14 +263,51 @@ def admin_dashboard():
     except Exception as e:
         logging.error(f"Admin dashboard error: {str(e)}")
         return jsonify({"error": "Failed to load dashboard"}), 500
+
+@app.route('/admin/cache/stats')
+@admin_required
+def cache_stats():
+    chat = response_cache.stats()
+    if chat_server_client:
+        # Chat answers are cached by the chat server; this worker's cache is unused
+        try:
+            chat = {**chat_server_client.state()["cache"], "source": "chat_server"}
+        except ChatServerError as e:
+            chat = {"source": "chat_server", "error": str(e)}
+    return jsonify({"catalogue": catalogue_cache.stats(), "chat": chat, "search": search_indexes.stats()})
+
+@app.route('/admin/db/pool')
+@admin_required
+def pool_stats():
+    stats = connection_pool.stats()
+    if replica_pool:
+        stats['replica'] = replica_pool.stats()
+    stats['routing'] = db_router.stats()
+    return jsonify(stats)
+
+@app.route('/admin/chat/reload', methods=['POST'])
+@admin_required
+def reload_knowledge_base():
+    if chat_server_client:
+        try:
+            return jsonify(chat_server_client.reload())
+        except ChatServerError as e:
+            logging.error(f"Knowledge base reload error: {str(e)}")
+            return jsonify({"error": str(e)}), e.status
+    try:
+        return jsonify(chat_models.reload())
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    except (OSError, ValueError) as e:
+        logging.error(f"Knowledge base reload error: {str(e)}")
+        return jsonify({"error": f"Knowledge base reload failed: {str(e)}"}), 400
     
 
 @app.route('/customers', methods=['GET', 'POST'])
 @db_connection
 def manage_customers(cursor, conn):
     if request.method == 'GET':
-        cursor.execute("SELECT * FROM Customers")
-        return jsonify(cursor.fetchall())
+        return list_response(cursor, CUSTOMERS_SQL, CUSTOMER_KEYSET)
     
     if request.method == 'POST':
         data = request.json
@@ -165,6 +320,7 @@ def manage_customers(cursor, conn):
             VALUES (%s, %s, %s, %s, %s)
         """, (data['first_name'], data['last_name'], data['email'], data['phone'], data['address']))
         conn.commit()
+        search_indexes.customers.add(cursor.lastrowid, data)
         return jsonify({"message": "Customer added successfully", "id": cursor.lastrowid})
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -200,29 +356,150 @@ def login(cursor, conn):
         logging.error(f"Login error: {str(e)}")
         return jsonify({"error": "Login failed"}), 500
 
-@app.route('/cars', methods=['GET'])
-@db_connection
-def display_cars(cursor, conn):
+def requested_date_range():
+    # Optional ?start=YYYY-MM-DD&end=YYYY-MM-DD on the car listings.
+    # Returns None when absent and raises ValueError when malformed.
+    if 'start' not in request.args and 'end' not in request.args:
+        return None
+    try:
+        start_date = parse_date(request.args['start'])
+        end_date = parse_date(request.args['end'])
+    except KeyError:
+        raise ValueError("Both start and end are required")
+    if end_date <= start_date:
+        raise ValueError("Invalid date range")
+    return start_date, end_date
+
+def on_primary(cursor, fill):
+    # Runs fill(cursor) with the handler's cursor when it is on the primary and
+    # with a primary connection of its own otherwise. The in-process caches
+    # (availability index, catalogue, statistics) are shared by every session,
+    # sticky ones included, so they are only ever filled from the primary.
+    if g.get('db_pool') != REPLICA:
+        return fill(cursor)
+    conn = connection_pool.get_connection()
+    primary_cursor = conn.cursor(dictionary=True)
+    try:
+        return fill(primary_cursor)
+    finally:
+        primary_cursor.close()
+        conn.close()
+
+def ensure_availability_loaded(cursor):
+    if g.get('db_pool') == REPLICA and availability_index.is_fresh():
+        return
+    on_primary(cursor, availability_index.ensure_loaded)
+
+def ensure_stats_fresh(cursor):
+    # Counters are kept up to date by the write paths; the tables are only
+    # queried when a periodic reconciliation is due
+    if rental_stats.is_due():
+        on_primary(cursor, rental_stats.reconcile)
+
+def cars_free_between(cursor, start_date, end_date):
+    ensure_availability_loaded(cursor)
     cursor.execute("""
         SELECT * FROM Cars 
-        WHERE status = 'Available'
+        WHERE status != 'Under Maintenance'
         ORDER BY price_per_day
     """)
     cars = cursor.fetchall()
-    return render_template('cars.html', cars=cars, 
-                          customer_name=session.get('customer_name'),
-                          customer_id=session.get('customer_id'))
+    # A car that is out right now (possibly overdue) cannot start a rental today
+    if start_date <= date.today():
+        cars = [car for car in cars if car['status'] != 'Rented']
+    return availability_index.free_cars(cars, start_date, end_date)
+
+def available_cars(cursor):
+    def load(cursor):
+        cursor.execute("""
+            SELECT * FROM Cars 
+            WHERE status = 'Available'
+            ORDER BY price_per_day
+        """)
+        return cursor.fetchall()
+    return catalogue_cache.get(lambda: on_primary(cursor, load))
+
+def requested_quote_ranges():
+    # One or more ?start=YYYY-MM-DD&end=YYYY-MM-DD pairs, matched up in order
+    starts, ends = request.args.getlist('start'), request.args.getlist('end')
+    if not starts or len(starts) != len(ends):
+        raise ValueError("Give a start and an end for every date range")
+    if len(starts) > MAX_RANGES:
+        raise ValueError(f"At most {MAX_RANGES} date ranges per quote")
+    ranges = []
+    for start, end in zip(starts, ends):
+        start_date, end_date = parse_date(start), parse_date(end)
+        if end_date <= start_date or (end_date - start_date).days > MAX_DAYS:
+            raise ValueError("Invalid date range")
+        ranges.append((start_date, end_date))
+    return ranges
+
+def conditional_response(etag, build):
+    # 304 when the client already holds this listing, otherwise build() it
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build())
+    response.set_etag(etag)
+    return response
+
+@app.route('/cars', methods=['GET'])
+@db_connection(read_only=True)
+def display_cars(cursor, conn):
+    try:
+        date_range = requested_date_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if date_range:
+        cars = cars_free_between(cursor, *date_range)
+        return render_template('cars.html', cars=cars, 
+                              customer_name=session.get('customer_name'),
+                              customer_id=session.get('customer_id'))
+
+    entry = available_cars(cursor)
+    # The page greets the logged-in customer, so each customer gets their own copy
+    variant = str(session.get('customer_id') or 0)
+
+    def render():
+        html = catalogue_cache.get_page(entry, variant)
+        if html is None:
+            html = render_template('cars.html', cars=entry.rows, 
+                                   customer_name=session.get('customer_name'),
+                                   customer_id=session.get('customer_id'))
+            catalogue_cache.put_page(entry, variant, html)
+        return html
+
+    return conditional_response(f"{entry.etag}-{variant}", render)
 
 # Rename the existing cars API endpoint
 @app.route('/api/cars', methods=['GET'])
-@db_connection
+@db_connection(read_only=True)
 def get_available_cars(cursor, conn):
-    cursor.execute("""
-        SELECT * FROM Cars 
-        WHERE status = 'Available'
-        ORDER BY price_per_day
-    """)
-    return jsonify(cursor.fetchall())
+    try:
+        date_range = requested_date_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if date_range:
+        return jsonify(cars_free_between(cursor, *date_range))
+
+    entry = available_cars(cursor)
+    return conditional_response(entry.etag, lambda: jsonify(entry.rows))
+
+@app.route('/api/quote', methods=['GET'])
+@db_connection(read_only=True)
+def quote(cursor, conn):
+    # Prices every available car for each requested date range; a car that
+    # is already booked during a range gets null for that range
+    try:
+        ranges = requested_quote_ranges()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    entry = available_cars(cursor)
+    ensure_availability_loaded(cursor)
+    return jsonify(quote_engine.quote(entry, ranges, availability_index.is_free))
 
 @app.route('/rentals', methods=['POST'])
 @db_connection
@@ -238,54 +515,144 @@ def rent_car(cursor, conn):
         days = (end_date - start_date).days
         if days < 1:
             return jsonify({"error": "Invalid date range"}), 400
-
-        # Use transaction for atomic operations
-        cursor.execute("START TRANSACTION")
-        
-        cursor.execute("SELECT price_per_day, status FROM Cars WHERE car_id = %s FOR UPDATE", (data['car_id'],))
-        car = cursor.fetchone()
-        if not car:
-            cursor.execute("ROLLBACK")
-            return jsonify({"error": "Car not found"}), 404
-        if car['status'] != 'Available':
-            cursor.execute("ROLLBACK")
-            return jsonify({"error": "Car is not available"}), 400
-
-        total_cost = car['price_per_day'] * days
-
-        cursor.execute("""
-            INSERT INTO Rentals (customer_id, car_id, start_date, end_date, total_cost, status) 
-            VALUES (%s, %s, %s, %s, %s, 'Ongoing')
-        """, (data['customer_id'], data['car_id'], data['start_date'], data['end_date'], total_cost))
-
-        cursor.execute("UPDATE Cars SET status = 'Rented' WHERE car_id = %s", (data['car_id'],))
-        
-        cursor.execute("COMMIT")
-        return jsonify({"message": "Car rented successfully", "total_cost": total_cost, "rental_id": cursor.lastrowid})
-
     except ValueError:
         return jsonify({"error": "Invalid date format"}), 400
 
+    # BOOKING_MODE picks row locking or an optimistic claim (see booking.py);
+    # either way deadlocks and lock wait timeouts are retried
+    try:
+        booked = with_lock_retry(conn, lambda: book(cursor, data['customer_id'], data['car_id'],
+                                                    start_date.date(), end_date.date()))
+    except BookingRejected as e:
+        return jsonify({"error": e.message}), e.status
+    except mysql.connector.Error as e:
+        if not is_retryable(e):
+            raise
+        conn.rollback()
+        logging.error(f"Booking gave up on lock contention: {str(e)}")
+        response = jsonify({"error": "The car is in high demand, please try again"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    availability_index.add(booked.rental_id, booked.car_id, start_date, end_date)
+    catalogue_cache.invalidate()
+    rental_stats.rental_started(booked.car_id, booked.starts_now)
+    return jsonify({"message": "Car rented successfully", "total_cost": booked.total_cost,
+                    "rental_id": booked.rental_id})
+
+@app.route('/rentals/batch', methods=['POST'])
+@db_connection
+def rent_cars_batch(cursor, conn):
+    # {"customer_id", "start_date", "end_date", "mode": "all_or_nothing" | "partial",
+    #  "rentals": [{"car_id", optional "start_date" / "end_date"}, ...]}
+    data = request.json or {}
+    if 'customer_id' not in data:
+        return jsonify({"error": "Missing required fields"}), 400
+    mode = data.get('mode', 'all_or_nothing')
+    if mode not in batch_booking.MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(batch_booking.MODES)}"}), 400
+    try:
+        items = batch_booking.parse_items(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cursor.execute("SELECT customer_id FROM Customers WHERE customer_id = %s", (data['customer_id'],))
+    if not cursor.fetchone():
+        return jsonify({"error": "Customer not found"}), 404
+
+    committed = batch_booking.book_batch(cursor, data['customer_id'], items, mode == 'all_or_nothing')
+    if committed:
+        for item in items:
+            if item.rental_id:
+                availability_index.add(item.rental_id, item.car_id, item.start_date, item.end_date)
+                rental_stats.rental_started(item.car_id, item.starts_now)
+        catalogue_cache.invalidate()
+
+    booked = sum(1 for item in items if item.rental_id)
+    body = {
+        "booked": booked,
+        "failed": len(items) - booked,
+        "total_cost": batch_booking.batch_total(items),
+        "rentals": [item.as_dict() for item in items],
+    }
+    return jsonify(body), 200 if committed else 409
+
 @app.route('/complete_rental/<int:rental_id>', methods=['PUT'])
 @db_connection
 def complete_rental(cursor, conn, rental_id):
+    # Same path as the bulk endpoint: the car is only released when it is out
+    # on a rental and no other started rental holds it, so completing a
+    # reservation that has not begun leaves the current renter's car alone
+    result = complete_rentals(cursor, [rental_id])
+    if not result.rentals:
+        return jsonify({"error": "Invalid rental or already completed"}), 400
+    return jsonify({"message": "Rental completed"})
+
+@app.route('/admin/rentals/complete', methods=['POST'])
+@admin_required
+@db_connection
+def bulk_complete_rentals(cursor, conn):
+    # {"rental_ids": [...]} completes those rentals; without ids, runs the
+    # overdue sweep now ("action": "complete" | "flag")
+    data = request.get_json(silent=True) or {}
+    try:
+        batch_size = int(data.get('batch_size', overdue_scheduler.batch_size))
+    except (TypeError, ValueError):
+        return jsonify({"error": "batch_size must be an integer"}), 400
+    if batch_size < 1:
+        return jsonify({"error": "batch_size must be positive"}), 400
+
+    if 'rental_ids' in data:
+        rental_ids = data['rental_ids']
+        if not isinstance(rental_ids, list) or not all(isinstance(i, int) for i in rental_ids):
+            return jsonify({"error": "rental_ids must be a list of integers"}), 400
+        return jsonify(complete_rentals(cursor, rental_ids, batch_size).as_dict())
+
+    action = data.get('action', 'complete')
+    if action not in OVERDUE_ACTIONS:
+        return jsonify({"error": f"action must be one of {', '.join(OVERDUE_ACTIONS)}"}), 400
+    summary = overdue_scheduler.sweep(cursor, conn, action, batch_size)
+    if summary is None:
+        return jsonify({"error": "An overdue sweep is already running"}), 409
+    return jsonify(summary)
+
+@app.route('/admin/rentals/overdue/status')
+@admin_required
+def overdue_status():
+    return jsonify(overdue_scheduler.state())
+
+@app.route('/cancel_rental/<int:rental_id>', methods=['PUT'])
+@db_connection
+def cancel_rental(cursor, conn, rental_id):
+    # The customer who holds the rental, or an admin
+    if not session.get('customer_id') and not session.get('is_admin'):
+        return jsonify({"error": "Please log in"}), 401
+
     cursor.execute("START TRANSACTION")
-    
+
     cursor.execute("SELECT * FROM Rentals WHERE rental_id = %s FOR UPDATE", (rental_id,))
     rental = cursor.fetchone()
+    if rental and not session.get('is_admin') and rental['customer_id'] != session.get('customer_id'):
+        cursor.execute("ROLLBACK")
+        return jsonify({"error": "Not your rental"}), 403
     if not rental or rental['status'] != 'Ongoing':
         cursor.execute("ROLLBACK")
         return jsonify({"error": "Invalid rental or already completed"}), 400
 
-    cursor.execute("UPDATE Rentals SET status = 'Completed' WHERE rental_id = %s", (rental_id,))
-    cursor.execute("""
-        UPDATE Cars 
-        SET status = 'Available' 
-        WHERE car_id = (SELECT car_id FROM Rentals WHERE rental_id = %s)
-    """, (rental_id,))
-    
+    cursor.execute("UPDATE Rentals SET status = 'Cancelled' WHERE rental_id = %s AND status = 'Ongoing'",
+                   (rental_id,))
+    if cursor.rowcount != 1:
+        cursor.execute("ROLLBACK")
+        return jsonify({"error": "Invalid rental or already completed"}), 400
+    # Same guarded release as completion: only a car that is out, and that no
+    # other started rental holds, goes back on the lot
+    released = release_cars(cursor, [rental['car_id']])
+
     cursor.execute("COMMIT")
-    return jsonify({"message": "Rental completed"})
+    availability_index.remove(rental_id)
+    catalogue_cache.invalidate()
+    rental_stats.rental_cancelled(released == 1)
+    return jsonify({"message": "Rental cancelled"})
 
 
 @app.route('/')
@@ -303,7 +670,7 @@ def serve_frontend():
 
 @app.route('/admin/customers')
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def admin_view_customers(cursor, conn):
     cursor.execute("""
         SELECT customer_id, first_name, last_name, email, phone, address 
@@ -315,7 +682,7 @@ def admin_view_customers(cursor, conn):
 
 @app.route('/admin/rentals/active')
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def admin_active_rentals(cursor, conn):
     cursor.execute("""
         SELECT r.*, c.first_name, c.last_name, cars.model
@@ -330,92 +697,136 @@ def admin_active_rentals(cursor, conn):
 
 @app.route('/admin/cars/manage', methods=['GET'])
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def admin_manage_cars(cursor, conn):
-    cursor.execute("SELECT * FROM Cars ORDER BY car_id DESC")
-    cars = cursor.fetchall()
-    return render_template('admin/cars.html', cars=cars)
+    try:
+        page = PageRequest.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page.stream:
+        return streamed_rows(CARS_SQL, CAR_KEYSET_NEWEST, page)
+
+    cars, next_cursor = fetch_page(cursor, CARS_SQL, CAR_KEYSET_NEWEST, page)
+    return render_template('admin/cars.html', cars=cars, next_cursor=next_cursor)
 
 @app.route('/admin/rentals/history')
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def rental_history(cursor, conn):
-    cursor.execute("""
-        SELECT r.*, c.first_name, c.last_name, cars.model
-        FROM Rentals r
-        JOIN Customers c ON r.customer_id = c.customer_id
-        JOIN Cars cars ON r.car_id = cars.car_id
-        ORDER BY r.start_date DESC
-    """)
-    rentals = cursor.fetchall()
-    return render_template('admin/rental_history.html', rentals=rentals)
+    try:
+        page = PageRequest.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page.stream:
+        return streamed_rows(RENTAL_DETAILS_SQL, RENTAL_HISTORY_KEYSET, page)
+
+    rentals, next_cursor = fetch_page(cursor, RENTAL_DETAILS_SQL, RENTAL_HISTORY_KEYSET, page)
+    return render_template('admin/rental_history.html', rentals=rentals, next_cursor=next_cursor)
+
+@app.route('/admin/rentals/export')
+@admin_required
+def export_rentals():
+    try:
+        export = ExportRequest.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        conn, _ = db_router.connection(True, session.get('db_last_write'))
+    except PoolTimeout as e:
+        logging.error(f"Database pool exhausted: {str(e)}")
+        return jsonify({"error": "Server is busy, please try again"}), 503
+
+    response = app.response_class(stream_export(conn, export), mimetype=export.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    # Returns the connection even if the body is never iterated
+    response.call_on_close(conn.close)
+    return response
 
 @app.route('/admin/statistics')  # Added @ symbol
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def get_statistics(cursor, conn):
-    # Get total revenue
-    cursor.execute("SELECT COALESCE(SUM(total_cost), 0) as total_revenue FROM Rentals WHERE status = 'Completed'")
-    revenue = cursor.fetchone()['total_revenue']
-
-    # Get active rentals count
-    cursor.execute("SELECT COUNT(*) as active_rentals FROM Rentals WHERE status = 'Ongoing'")
-    active_rentals = cursor.fetchone()['active_rentals']
-
-    # Get available cars count
-    cursor.execute("SELECT COUNT(*) as available_cars FROM Cars WHERE status = 'Available'")
-    available_cars = cursor.fetchone()['available_cars']
+    ensure_stats_fresh(cursor)
+    return render_template('admin/statistics.html', stats=rental_stats.snapshot())
 
-    # Get popular cars (most rented)
-    cursor.execute("""
-        SELECT c.model, COUNT(r.rental_id) as rental_count
-        FROM Cars c
-        LEFT JOIN Rentals r ON c.car_id = r.car_id
-        GROUP BY c.car_id, c.model
-        ORDER BY rental_count DESC
-        LIMIT 5
-    """)
-    popular_cars = cursor.fetchall()
-
-    return render_template('admin/statistics.html', stats={
-        "total_revenue": revenue,
-        "active_rentals": active_rentals,
-        "available_cars": available_cars,
-        "popular_cars": popular_cars
-    })
+@app.route('/admin/statistics/revenue')
+@admin_required
+@db_connection(read_only=True)
+def revenue_trend(cursor, conn):
+    granularity = request.args.get('granularity', 'daily')
+    if granularity not in ('daily', 'monthly'):
+        return jsonify({"error": "granularity must be daily or monthly"}), 400
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+
+    ensure_stats_fresh(cursor)
+    return jsonify(rental_stats.revenue_series(granularity, days))
+
+# Rentals are found through their customer's or car's index entry
+RENTAL_SEARCH_CANDIDATES = 1000
+
+def rows_by_rank(cursor, sql, hits, key):
+    # Fetches the rows for [(id, score)] by primary key, keeping the ranking
+    if not hits:
+        return []
+    placeholders = ", ".join(["%s"] * len(hits))
+    cursor.execute(sql.format(placeholders), [doc_id for doc_id, _ in hits])
+    rows = {row[key]: row for row in cursor.fetchall()}
+    ranked = []
+    for doc_id, score in hits:
+        if doc_id in rows:
+            rows[doc_id]['score'] = round(score, 3)
+            ranked.append(rows[doc_id])
+    return ranked
+
+def ranked_search(cursor, search_type, term, limit):
+    if search_type == 'customers':
+        return rows_by_rank(cursor, CUSTOMERS_BY_ID_SQL, search_indexes.customers.search(term, limit),
+                            'customer_id')
+    if search_type == 'cars':
+        return rows_by_rank(cursor, CARS_BY_ID_SQL, search_indexes.cars.search(term, limit), 'car_id')
+    if search_type == 'rentals':
+        customer_scores = dict(search_indexes.customers.search(term, RENTAL_SEARCH_CANDIDATES))
+        car_scores = dict(search_indexes.cars.search(term, RENTAL_SEARCH_CANDIDATES))
+        if not customer_scores and not car_scores:
+            return []
+        cursor.execute(*rentals_by_party_query(list(customer_scores), list(car_scores), limit))
+        rentals = cursor.fetchall()
+        for rental in rentals:
+            rental['score'] = round(max(customer_scores.get(rental['customer_id'], 0.0),
+                                        car_scores.get(rental['car_id'], 0.0)), 3)
+        # Stable sort keeps newest first among equal scores
+        rentals.sort(key=lambda rental: rental['score'], reverse=True)
+        return rentals
+    return []
 
 @app.route('/admin/search', methods=['POST'])
 @admin_required
-@db_connection
+@db_connection(read_only=True)
 def admin_search(cursor, conn):
     data = request.json
+    search_indexes.ensure_loaded(connection_pool.get_connection)
+
+    # Ranked, typo-tolerant search once the index is built. Paging through or
+    # streaming every match (cursor / format) still uses the LIKE queries.
+    if search_indexes.ready and 'cursor' not in data and 'format' not in data:
+        try:
+            limit = PageRequest.from_args(data).limit
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        search_indexes.sync(cursor)
+        return jsonify(ranked_search(cursor, data['type'], data['search'], limit))
+
     search_term = f"%{data['search']}%"
     
-    if data['type'] == 'customers':
-        cursor.execute("""
-            SELECT * FROM Customers 
-            WHERE first_name LIKE %s 
-            OR last_name LIKE %s 
-            OR email LIKE %s
-        """, (search_term, search_term, search_term))
-    elif data['type'] == 'cars':
-        cursor.execute("""
-            SELECT * FROM Cars 
-            WHERE model LIKE %s 
-            OR status LIKE %s
-        """, (search_term, search_term))
-    elif data['type'] == 'rentals':
-        cursor.execute("""
-            SELECT r.*, c.first_name, c.last_name, cars.model
-            FROM Rentals r
-            JOIN Customers c ON r.customer_id = c.customer_id
-            JOIN Cars cars ON r.car_id = cars.car_id
-            WHERE c.first_name LIKE %s 
-            OR c.last_name LIKE %s 
-            OR cars.model LIKE %s
-        """, (search_term, search_term, search_term))
+    # limit / cursor / format are read from the JSON body
+    if data['type'] in SEARCH_FILTERS:
+        select_sql, keyset, where = SEARCH_FILTERS[data['type']]
+        return list_response(cursor, select_sql, keyset, where, [search_term] * where.count('%s'), args=data)
     
-    return jsonify(cursor.fetchall())
+    return jsonify([])
 
 
 @app.route('/admin/cars', methods=['POST', 'PUT', 'DELETE'])
@@ -433,6 +844,9 @@ def manage_cars(cursor, conn):
             VALUES (%s, %s, %s, %s)
         """, (data['model'], data['year'], data['price_per_day'], data['status']))
         conn.commit()
+        catalogue_cache.invalidate()
+        search_indexes.cars.add(cursor.lastrowid, data)
+        rental_stats.car_added(cursor.lastrowid, data['model'], data['status'])
         return jsonify({"message": "Car added successfully", "id": cursor.lastrowid})
 
     if request.method == 'PUT':
@@ -443,15 +857,58 @@ def manage_cars(cursor, conn):
             WHERE car_id = %s
         """, (data['model'], data['year'], data['price_per_day'], data['status'], data['car_id']))
         conn.commit()
+        catalogue_cache.invalidate()
+        search_indexes.reindex_car(cursor, data['car_id'])
+        rental_stats.mark_dirty()
         return jsonify({"message": "Car updated successfully"})
 
     if request.method == 'DELETE':
         car_id = request.args.get('car_id')
         cursor.execute("DELETE FROM Cars WHERE car_id = %s", (car_id,))
         conn.commit()
+        catalogue_cache.invalidate()
+        search_indexes.reindex_car(cursor, car_id)
+        # Deleting a car cascades to its rentals
+        rental_stats.mark_dirty()
         return jsonify({"message": "Car deleted successfully"})
 
 
+def run_import(cursor, conn, spec):
+    # Body is CSV (text/csv, with a header row) or NDJSON, read as a stream
+    content_type = request.mimetype or ''
+    if 'csv' not in content_type and 'ndjson' not in content_type and 'json' not in content_type:
+        return jsonify({"error": "Send text/csv or application/x-ndjson"}), 415
+    on_duplicate = request.args.get('on_duplicate', 'update')
+    if on_duplicate not in bulk_import.DUPLICATE_MODES:
+        return jsonify({"error": f"on_duplicate must be one of {', '.join(bulk_import.DUPLICATE_MODES)}"}), 400
+    try:
+        chunk_size = max(1, min(int(request.args.get('chunk_size', bulk_import.CHUNK_SIZE)), 5000))
+    except ValueError:
+        return jsonify({"error": "chunk_size must be an integer"}), 400
+
+    records = bulk_import.iter_records(request.stream, content_type)
+    result = bulk_import.import_records(cursor, conn, spec, records, on_duplicate, chunk_size)
+    return jsonify(result.as_dict())
+
+@app.route('/admin/cars/import', methods=['POST'])
+@admin_required
+@db_connection
+def import_cars(cursor, conn):
+    response = run_import(cursor, conn, bulk_import.CARS)
+    catalogue_cache.invalidate()
+    search_indexes.invalidate()
+    rental_stats.mark_dirty()
+    return response
+
+@app.route('/admin/customers/import', methods=['POST'])
+@admin_required
+@db_connection
+def import_customers(cursor, conn):
+    response = run_import(cursor, conn, bulk_import.CUSTOMERS)
+    search_indexes.invalidate()
+    return response
+
+
 @app.route('/admin/login', methods=['GET', 'POST'])
 @db_connection
 def admin_login(cursor, conn):
@@ -505,6 +962,7 @@ def register(cursor, conn):
         """, (data['first_name'], data['last_name'], data['email'], 
               data['phone'], data['address'], hashed_password))
         conn.commit()
+        search_indexes.customers.add(cursor.lastrowid, data)
         return jsonify({"message": "Registration successful", "id": cursor.lastrowid})
     except mysql.connector.Error as e:
         logging.error(f"Database error during registration: {str(e)}")
@@ -589,6 +1047,7 @@ def profile(cursor, conn):
                 return jsonify({"error": "Incorrect old password"}), 400
         
         conn.commit()
+        search_indexes.reindex_customer(cursor, customer_id)
         
         # Update session name
         session['customer_name'] = f"{data['first_name']} {data['last_name']}"
@@ -0,0 +1,114 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime
+
+# Date-range availability. Every 'Ongoing' rental blocks its car for
+# [start_date, end_date). The in-memory index keeps each car's bookings sorted
+# by start date, and since bookings for one car never overlap, an overlap test
+# is a single bisect. Other workers book and cancel cars too, so the index is
+# rebuilt from the Rentals table every REFRESH_SECONDS and may lag behind it
+# until then. It only pre-filters listings and quotes: bookings are decided
+# by check_overlap() against the database under the car's row lock.
+REFRESH_SECONDS = 60
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class AvailabilityIndex:
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._bookings = {}  # car_id -> sorted [(start, end, rental_id)]
+        self._rentals = {}  # rental_id -> (car_id, start, end)
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    def ensure_loaded(self, cursor):
+        if self.is_fresh():
+            return
+        # Bookings that ended before today can no longer block anything
+        cursor.execute("""
+            SELECT rental_id, car_id, start_date, end_date
+            FROM Rentals
+            WHERE status = 'Ongoing' AND end_date > CURDATE()
+        """)
+        bookings = {}
+        rentals = {}
+        for row in cursor.fetchall():
+            start, end = parse_date(row['start_date']), parse_date(row['end_date'])
+            bookings.setdefault(row['car_id'], []).append((start, end, row['rental_id']))
+            rentals[row['rental_id']] = (row['car_id'], start, end)
+        for intervals in bookings.values():
+            intervals.sort()
+        with self._lock:
+            self._bookings = bookings
+            self._rentals = rentals
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def add(self, rental_id, car_id, start, end):
+        start, end = parse_date(start), parse_date(end)
+        with self._lock:
+            insort(self._bookings.setdefault(car_id, []), (start, end, rental_id))
+            self._rentals[rental_id] = (car_id, start, end)
+
+    def remove(self, rental_id):
+        # Called when a rental is completed or cancelled
+        with self._lock:
+            booking = self._rentals.pop(rental_id, None)
+            if booking is None:
+                return
+            car_id, start, end = booking
+            intervals = self._bookings.get(car_id, [])
+            pos = bisect_left(intervals, (start, end, rental_id))
+            if pos < len(intervals) and intervals[pos][2] == rental_id:
+                intervals.pop(pos)
+
+    def is_free(self, car_id, start, end):
+        start, end = parse_date(start), parse_date(end)
+        with self._lock:
+            intervals = self._bookings.get(car_id)
+            if not intervals:
+                return True
+            # The only booking that can overlap is the last one starting before `end`
+            pos = bisect_left(intervals, (end,))
+            return pos == 0 or intervals[pos - 1][1] <= start
+
+    def free_cars(self, cars, start, end):
+        return [car for car in cars if self.is_free(car['car_id'], start, end)]
+
+
+def has_overlap(cursor, car_id, start, end):
+    # Authoritative check, run inside the booking transaction. Only touches the
+    # car's own rentals through the (car_id, start_date) prefix.
+    cursor.execute("""
+        SELECT rental_id FROM Rentals
+        WHERE car_id = %s AND status = 'Ongoing'
+        AND start_date < %s AND end_date > %s
+        LIMIT 1
+    """, (car_id, end, start))
+    return cursor.fetchone() is not None
+
+
+def check_overlap(cursor, car_id, start, end):
+    # has_overlap(), whatever the index says. An index that disagrees missed
+    # another worker's booking or cancellation and is reloaded on next use.
+    overlap = has_overlap(cursor, car_id, start, end)
+    if overlap == availability_index.is_free(car_id, start, end):
+        availability_index.invalidate()
+    return overlap
+
+
+availability_index = AvailabilityIndex()
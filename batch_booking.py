@@ -0,0 +1,155 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+from availability import parse_date
+from quote_engine import quote_engine
+
+# Multi-car reservations for /rentals/batch. Every car in the batch is locked
+# with a single SELECT ... FOR UPDATE ordered by car_id, so two batches (or a
+# batch and rent_car) touching the same cars always take the locks in the same
+# order and queue instead of deadlocking. Overlaps are checked with one query
+# over all the locked cars, and everything commits in one transaction.
+MAX_BATCH_SIZE = int(os.environ.get("BATCH_BOOKING_MAX_SIZE", 100))
+MODES = ("all_or_nothing", "partial")
+
+
+class BookingItem:
+    def __init__(self, index, car_id, start_date, end_date):
+        self.index = index
+        self.car_id = car_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rental_id = None
+        self.total_cost = None
+        self.error = None
+
+    @property
+    def days(self):
+        return (self.end_date - self.start_date).days
+
+    @property
+    def starts_now(self):
+        return self.start_date <= date.today()
+
+    def overlaps(self, start, end):
+        return self.start_date < end and self.end_date > start
+
+    def as_dict(self):
+        result = {
+            "index": self.index,
+            "car_id": self.car_id,
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+        }
+        if self.rental_id:
+            result.update(status="booked", rental_id=self.rental_id, total_cost=self.total_cost)
+        elif self.error:
+            result.update(status="failed", error=self.error)
+        else:
+            # Valid on its own, but an all_or_nothing batch failed elsewhere
+            result["status"] = "rolled_back"
+        return result
+
+
+def parse_items(data):
+    # Each entry needs a car_id and may override the batch's start_date /
+    # end_date. Raises ValueError for a malformed request.
+    rentals = data.get("rentals")
+    if not isinstance(rentals, list) or not rentals:
+        raise ValueError("rentals must be a non-empty list")
+    if len(rentals) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} rentals per batch")
+
+    items = []
+    for index, entry in enumerate(rentals):
+        if not isinstance(entry, dict):
+            raise ValueError(f"rentals[{index}] must be an object")
+        try:
+            car_id = int(entry["car_id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"rentals[{index}] needs an integer car_id")
+        try:
+            start = parse_date(entry.get("start_date", data.get("start_date")))
+            end = parse_date(entry.get("end_date", data.get("end_date")))
+        except (TypeError, ValueError):
+            raise ValueError(f"rentals[{index}] has a missing or invalid date")
+        if end <= start:
+            raise ValueError(f"rentals[{index}] has an invalid date range")
+        items.append(BookingItem(index, car_id, start, end))
+    return items
+
+
+def _booked_ranges(cursor, car_ids, start, end):
+    # Ongoing rentals on the locked cars that fall inside the batch's overall
+    # window, through the (car_id, start_date) index
+    placeholders = ", ".join(["%s"] * len(car_ids))
+    cursor.execute(f"""
+        SELECT car_id, start_date, end_date FROM Rentals
+        WHERE car_id IN ({placeholders}) AND status = 'Ongoing'
+        AND start_date < %s AND end_date > %s
+    """, (*car_ids, end, start))
+    booked = {}
+    for row in cursor.fetchall():
+        booked.setdefault(row['car_id'], []).append((parse_date(row['start_date']), parse_date(row['end_date'])))
+    return booked
+
+
+def book_batch(cursor, customer_id, items, all_or_nothing=True):
+    # Returns True when the transaction committed. Items are updated in place
+    # with their rental_id / total_cost or error; with all_or_nothing a single
+    # failure rolls the whole batch back.
+    car_ids = sorted({item.car_id for item in items})
+    placeholders = ", ".join(["%s"] * len(car_ids))
+
+    cursor.execute("START TRANSACTION")
+    cursor.execute(f"""
+        SELECT car_id, price_per_day, status FROM Cars
+        WHERE car_id IN ({placeholders})
+        ORDER BY car_id
+        FOR UPDATE
+    """, car_ids)
+    cars = {row['car_id']: row for row in cursor.fetchall()}
+    booked = _booked_ranges(cursor, car_ids,
+                            min(item.start_date for item in items),
+                            max(item.end_date for item in items))
+
+    # Check in car_id order so results do not depend on how the client
+    # ordered the request; accepted items also block later items in the batch
+    accepted = []
+    for item in sorted(items, key=lambda item: (item.car_id, item.start_date)):
+        car = cars.get(item.car_id)
+        if car is None:
+            item.error = "Car not found"
+        elif car['status'] == 'Under Maintenance' or (item.starts_now and car['status'] != 'Available'):
+            item.error = "Car is not available"
+        elif any(item.overlaps(start, end) for start, end in booked.get(item.car_id, ())):
+            item.error = "Car is already booked for those dates"
+        else:
+            item.total_cost = quote_engine.price(car['price_per_day'], item.start_date, item.end_date)
+            booked.setdefault(item.car_id, []).append((item.start_date, item.end_date))
+            accepted.append(item)
+
+    if not accepted or (all_or_nothing and len(accepted) < len(items)):
+        cursor.execute("ROLLBACK")
+        for item in accepted:
+            item.total_cost = None
+        return False
+
+    for item in accepted:
+        cursor.execute("""
+            INSERT INTO Rentals (customer_id, car_id, start_date, end_date, total_cost, status)
+            VALUES (%s, %s, %s, %s, %s, 'Ongoing')
+        """, (customer_id, item.car_id, item.start_date, item.end_date, item.total_cost))
+        item.rental_id = cursor.lastrowid
+
+    taken = sorted({item.car_id for item in accepted if item.starts_now})
+    if taken:
+        cursor.execute(f"UPDATE Cars SET status = 'Rented' WHERE car_id IN ({', '.join(['%s'] * len(taken))})",
+                       taken)
+    cursor.execute("COMMIT")
+    return True
+
+
+def batch_total(items):
+    return sum((item.total_cost for item in items if item.rental_id), Decimal(0))
@@ -0,0 +1,102 @@
+# Recall vs latency of the knowledge base index backends on a synthetic KB.
+#
+#   python benchmarks/ann_recall.py --sizes 10000 100000 1000000 --k 5
+#
+# Knowledge base vectors are random unit vectors in clusters (roughly how FAQ
+# embeddings group by topic); queries are perturbed copies of stored vectors.
+# Recall@k is measured against the exact flat index.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_index import IndexConfig, build_faiss_index  # noqa: E402
+
+CONFIGS = [
+    IndexConfig("flat", "float32"),
+    IndexConfig("flat", "float16"),
+    IndexConfig("flat", "int8"),
+    IndexConfig("ivf", "float32", nprobe=8),
+    IndexConfig("ivf", "float32", nprobe=32),
+    IndexConfig("ivf", "int8", nprobe=32),
+    IndexConfig("hnsw", "float32", ef_search=64),
+    IndexConfig("hnsw", "float16", ef_search=64),
+    IndexConfig("hnsw", "int8", ef_search=128),
+]
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_kb(size, dim, rng):
+    centers = unit(rng.standard_normal((max(1, size // 100), dim)).astype("float32"))
+    assignment = rng.integers(0, len(centers), size)
+    return unit(centers[assignment] + 0.3 * rng.standard_normal((size, dim)).astype("float32"))
+
+
+def recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def bench(config, vectors, queries, truth, k):
+    started = time.perf_counter()
+    index = build_faiss_index(vectors, config)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found.append(indices[0])
+    latencies.sort()
+
+    return {
+        "index": config.spec(),
+        "nprobe": config.nprobe if config.backend == "ivf" else None,
+        "ef_search": config.ef_search if config.backend == "hnsw" else None,
+        "build_s": round(build_seconds, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        f"recall@{k}": round(recall(found, truth), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare knowledge base index backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        vectors = synthetic_kb(size, args.dim, rng)
+        picks = rng.integers(0, size, args.queries)
+        queries = unit(vectors[picks] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype("float32"))
+
+        exact = build_faiss_index(vectors, IndexConfig("flat"))
+        _, truth = exact.search(queries, args.k)
+
+        for config in CONFIGS:
+            row = bench(config, vectors, queries, truth, args.k)
+            row["size"] = size
+            print(json.dumps(row))
+            results.append(row)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
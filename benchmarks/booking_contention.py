@@ -0,0 +1,150 @@
+# Booking contention benchmark: many clients race to rent the same car the
+# moment it is released, under each BOOKING_MODE (see booking.py).
+#
+#   python benchmarks/booking_contention.py --clients 100 --rounds 5
+#
+# Each round puts the hot car back on the lot, releases --clients threads at
+# once through a barrier, each POSTing /rentals for that car from today, and
+# checks that exactly one of them got it. Every mode runs in its own process
+# on a fresh SQLite stand-in (the mode is read at import time), and the
+# results for all modes are printed as one JSON document.
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import standin_db  # noqa: E402
+from load import git_commit, percentile  # noqa: E402
+
+MODES = ["locking", "optimistic"]
+
+
+def release_car(db_path, app_module, car_id):
+    # The previous round's winner returns the car
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    rental_ids = [row[0] for row in conn.execute(
+        "SELECT rental_id FROM Rentals WHERE car_id = ? AND status = 'Ongoing'", (car_id,))]
+    conn.execute("UPDATE Rentals SET status = 'Completed' WHERE car_id = ? AND status = 'Ongoing'", (car_id,))
+    conn.execute("UPDATE Cars SET status = 'Available' WHERE car_id = ?", (car_id,))
+    conn.close()
+    for rental_id in rental_ids:
+        app_module.availability_index.remove(rental_id)
+    app_module.catalogue_cache.invalidate()
+
+
+def run_mode(args):
+    workdir = tempfile.mkdtemp(prefix="car-rental-contention-")
+    db_path = os.path.join(workdir, "car_rental.sqlite")
+    standin_db.seed(db_path, cars=50, customers=max(args.clients, 100), rentals=500)
+    os.environ.update({
+        "BOOKING_MODE": args.mode,
+        "DB_POOL_MAX_SIZE": str(args.clients + 5),
+        "DB_POOL_TIMEOUT": "60",
+        "CHAT_WARMUP": "lazy",
+        "OVERDUE_INTERVAL_SECONDS": "0",
+        "SLOW_REQUEST_SECONDS": "0",
+    })
+    standin_db.install(db_path)
+    import app as app_module  # noqa: E402
+
+    flask_app = app_module.app
+    car_id = flask_app.test_client().get("/api/cars").json[0]["car_id"]
+    today = date.today()
+    latencies = []
+    statuses = {}
+    winners = []
+    lock = threading.Lock()
+    elapsed = 0.0
+
+    for round_number in range(args.rounds):
+        release_car(db_path, app_module, car_id)
+        barrier = threading.Barrier(args.clients)
+        round_statuses = {}
+
+        def client(n):
+            test_client = flask_app.test_client()
+            payload = {"car_id": car_id, "customer_id": n + 1, "start_date": today.isoformat(),
+                       "end_date": (today + timedelta(days=1 + n % 3)).isoformat()}
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                status = test_client.post("/rentals", json=payload).status_code
+            except Exception:
+                status = "exception"
+            took = time.perf_counter() - started
+            with lock:
+                latencies.append(took)
+                round_statuses[status] = round_statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+        for t in threads:
+            t.start()
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed += time.perf_counter() - started
+        winners.append(round_statuses.get(200, 0))
+        for status, count in round_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    counters = {}
+    for line in app_module.metrics.render().splitlines():
+        if line.startswith(("booking_lock_retries_total", "booking_claims_missed_total")):
+            name = line.split("{")[0].split(" ")[0]
+            counters[name] = counters.get(name, 0) + int(float(line.rsplit(" ", 1)[1]))
+    return {
+        "mode": args.mode,
+        "clients": args.clients,
+        "rounds": args.rounds,
+        "requests": len(latencies),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "winners_per_round": winners,
+        "exactly_one_winner": all(count == 1 for count in winners),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "lock_retries": counters.get("booking_lock_retries_total", 0),
+        "claims_missed": counters.get("booking_claims_missed_total", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark booking modes under contention for one car")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--mode", choices=MODES, help="run a single mode in this process")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    results = {"commit": git_commit(), "modes": {}}
+    for mode in MODES:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--mode", mode,
+                                          "--clients", str(args.clients), "--rounds", str(args.rounds)],
+                                         text=True)
+        results["modes"][mode] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(result["exactly_one_winner"] for result in results["modes"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Compares one-at-a-time chat lookups with the micro-batched path.
+#
+#   python benchmarks/chat_batching.py --clients 16 --requests 50
+#
+# Each client thread issues queries back to back; the script prints throughput
+# and p50/p99 latency for both paths. The response cache is bypassed so every
+# request reaches the embedder.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_batcher import SearchBatcher  # noqa: E402
+from chatbot import chat_models  # noqa: E402
+
+QUERIES = [
+    "What documents do I need to rent a car?",
+    "What is your cancellation policy?",
+    "Can I return the car at a different branch?",
+    "Is insurance included in the price?",
+    "How old do I have to be to rent?",
+    "Do you allow pets in the cars?",
+    "What happens if I return the car late?",
+    "Can I add a second driver?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(search, clients, requests_per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        local = []
+        for i in range(requests_per_client):
+            query = QUERIES[(offset + i) % len(QUERIES)]
+            started = time.perf_counter()
+            search(query)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and batched chat lookups")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    if not chat_models.wait_until_ready():
+        sys.exit(f"Chat models failed to load: {chat_models.error}")
+    kb = chat_models.kb
+
+    def single(query):
+        kb.index.search(chat_models.encode([query]), 1)
+
+    batcher = SearchBatcher(chat_models.encode, args.max_batch_size, args.max_wait_ms / 1000.0)
+
+    def batched(query):
+        batcher.search(kb, query, 1)
+
+    results = {
+        "single": run(single, args.clients, args.requests),
+        "batched": run(batched, args.clients, args.requests),
+        "batching": batcher.stats(),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
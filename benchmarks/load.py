@@ -0,0 +1,263 @@
+# Load benchmark for app.py against a local SQLite stand-in.
+#
+#   python benchmarks/load.py --clients 16 --requests 200 --output results.json
+#
+# Seeds a synthetic database (see standin_db.py), imports app.py on top of it
+# and drives each scenario from --clients threads through Flask's test client,
+# so numbers cover routing, the app code, the pool and SQL but not a WSGI
+# server or the network. Chat uses a hashing embedder by default so runs need
+# no model download; --embedder model loads CHAT_EMBEDDING_MODEL instead.
+# Results (throughput, p50/p90/p99 latency, status counts) are written as JSON
+# tagged with the git commit, for comparing runs across commits.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import standin_db  # noqa: E402
+
+SCENARIOS = ["catalogue", "catalogue_dates", "rent_contended", "statistics", "chat"]
+CHAT_QUESTIONS = [
+    ("What documents do I need to rent a car?", "A valid driving licence and a government issued ID."),
+    ("What is your cancellation policy?", "Cancel up to 24 hours before pick-up for a full refund."),
+    ("Can I return the car at a different branch?", "Yes, one-way rentals carry a drop-off fee."),
+    ("Is insurance included in the price?", "Basic insurance is included; full cover is extra."),
+    ("How old do I have to be to rent?", "Drivers must be at least 21 years old."),
+    ("Do you allow pets in the cars?", "Pets are allowed in a carrier; cleaning fees may apply."),
+    ("What happens if I return the car late?", "Late returns are charged an extra day after one hour."),
+    ("Can I add a second driver?", "Yes, additional drivers can be added at the counter."),
+]
+CHAT_QUERIES = [question for question, _ in CHAT_QUESTIONS] + [
+    "which documents are needed", "cancel my booking", "drop the car somewhere else",
+    "insurance cost", "minimum age", "bring my dog", "returning late", "extra driver",
+]
+
+
+class HashingEmbedder:
+    # Stand-in for SentenceTransformer: signed feature hashing of words and
+    # character trigrams, L2-normalized. Deterministic and download-free.
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            words = text.lower().split()
+            features = words + [word[i:i + 3] for word in words for i in range(max(1, len(word) - 2))]
+            for feature in features:
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(flask_app, request, clients, requests_per_client, setup=None):
+    latencies = []
+    statuses = {}
+    failures = []
+    lock = threading.Lock()
+
+    def client(worker):
+        test_client = flask_app.test_client()
+        if setup:
+            setup(test_client)
+        rng = random.Random(worker)
+        local, local_statuses = [], {}
+        for i in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                status = request(test_client, rng, worker, i)
+            except Exception as e:
+                status = "exception"
+                with lock:
+                    failures.append(str(e))
+            local.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status == "exception" or status >= 500)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "sample_failures": failures[:5],
+    }
+
+
+def admin_login(test_client):
+    response = test_client.post("/admin/login", json={"username": standin_db.ADMIN_USERNAME,
+                                                      "password": standin_db.ADMIN_PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f"Admin login failed with {response.status_code}")
+
+
+def build_scenarios(args, app_module):
+    today = date.today()
+
+    def catalogue(test_client, rng, worker, i):
+        return test_client.get("/api/cars").status_code
+
+    def catalogue_dates(test_client, rng, worker, i):
+        start = today + timedelta(days=rng.randint(1, 90))
+        end = start + timedelta(days=rng.randint(1, 14))
+        response = test_client.get(f"/api/cars?start={start}&end={end}")
+        # Only the plain listing is cached and carries an ETag; seeing one here
+        # means the date filter was ignored and this measures the wrong path
+        if response.status_code == 200 and "ETag" in response.headers:
+            raise AssertionError("catalogue_dates got the unfiltered listing")
+        return response.status_code
+
+    def rent_contended(test_client, rng, worker, i):
+        # Every client books the same car for overlapping future windows
+        start = today + timedelta(days=rng.randint(1, 365))
+        end = start + timedelta(days=rng.randint(1, 7))
+        return test_client.post("/rentals", json={
+            "car_id": args.hot_car,
+            "customer_id": rng.randint(1, args.customers),
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+        }).status_code
+
+    def statistics(test_client, rng, worker, i):
+        # The revenue JSON behind the /admin/statistics dashboard, not the page
+        # itself: that renders admin/statistics.html, which is not in this
+        # tree, so the page would only measure a template error. Both read
+        # the same rental_stats snapshot.
+        return test_client.get("/admin/statistics/revenue?days=365").status_code
+
+    def chat(test_client, rng, worker, i):
+        return test_client.post("/chat", json={"message": rng.choice(CHAT_QUERIES)}).status_code
+
+    return {
+        "catalogue": (catalogue, None),
+        "catalogue_dates": (catalogue_dates, None),
+        "rent_contended": (rent_contended, None),
+        "statistics": (statistics, admin_login),
+        "chat": (chat, None),
+    }
+
+
+def prepare_chat(args, workdir):
+    kb_path = os.path.join(workdir, "knowledge_base.json")
+    with open(kb_path, "w") as f:
+        json.dump([{"question": q, "answer": a} for q, a in CHAT_QUESTIONS], f)
+    os.environ["CHAT_KNOWLEDGE_BASE"] = kb_path
+    os.environ["CHAT_WARMUP"] = "lazy"
+    os.environ["CHAT_KB_WATCH_INTERVAL"] = "0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the car rental app on a SQLite stand-in")
+    parser.add_argument("--cars", type=int, default=500)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--rentals", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--hot-car", type=int, help="car_id every rent_contended client books "
+                                                    "(default: the first available car)")
+    parser.add_argument("--embedder", choices=["hashing", "model"], default="hashing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="car-rental-bench-")
+    db_path = os.path.join(workdir, "car_rental.sqlite")
+    started = time.perf_counter()
+    standin_db.seed(db_path, args.cars, args.customers, args.rentals, args.seed)
+    seed_seconds = time.perf_counter() - started
+
+    os.environ.setdefault("DB_POOL_MAX_SIZE", str(max(args.clients, 10)))
+    os.environ.setdefault("SLOW_REQUEST_SECONDS", "0")
+    prepare_chat(args, workdir)
+    standin_db.install(db_path)
+    import app as app_module  # noqa: E402
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "seed_seconds": round(seed_seconds, 2),
+        "scenarios": {},
+    }
+
+    if "chat" in scenarios:
+        chat_models = app_module.chat_models
+        if args.embedder == "hashing":
+            chat_models._load_embedder = HashingEmbedder
+        if not chat_models.wait_until_ready(timeout=300):
+            results["scenarios"]["chat"] = {"skipped": f"chat models not ready: {chat_models.error}"}
+            scenarios.remove("chat")
+
+    if args.hot_car is None:
+        args.hot_car = app_module.app.test_client().get("/api/cars").get_json()[0]["car_id"]
+        results["config"]["hot_car"] = args.hot_car
+
+    available = build_scenarios(args, app_module)
+    for name in scenarios:
+        request, setup = available[name]
+        result = run_scenario(app_module.app, request, args.clients, args.requests, setup)
+        results["scenarios"][name] = result
+        print(json.dumps({"scenario": name, **{k: v for k, v in result.items() if k != "sample_failures"}}))
+
+    results["pool"] = app_module.connection_pool.stats()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Fleet-wide quoting with quote_engine against pricing one car at a time.
+#
+#   python benchmarks/quote_engine.py --cars 5000 --ranges 4
+#
+# The "per car" column runs QuoteEngine.price() for every car and range, which
+# is what a loop over the fleet calling the single-car path would cost.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_engine import PricingRules, QuoteEngine  # noqa: E402
+
+
+class _Entry:
+    def __init__(self, rows):
+        self.rows = rows
+        self.etag = str(len(rows))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return result, samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fleet quoting")
+    parser.add_argument("--cars", type=int, default=5000)
+    parser.add_argument("--ranges", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [{"car_id": car_id, "model": "Model", "make": "Make", "price_per_day": rng.randint(3000, 15000) / 100}
+            for car_id in range(1, args.cars + 1)]
+    today = date.today()
+    ranges = []
+    for _ in range(args.ranges):
+        start = today + timedelta(days=rng.randint(1, 180))
+        ranges.append((start, start + timedelta(days=rng.randint(1, 30))))
+
+    engine = QuoteEngine(PricingRules(1.15, {6: 1.2, 7: 1.3, 8: 1.3, 12: 1.25}, {7: 0.1, 28: 0.25}))
+    entry = _Entry(rows)
+    engine.fleet(entry)
+
+    fleet_quote, fleet_ms = timed(lambda: engine.quote(entry, ranges), args.repeat)
+    per_car, per_car_ms = timed(lambda: [[engine.price(row["price_per_day"], start, end) for start, end in ranges]
+                                         for row in rows], 1)
+    assert [quote["totals"] for quote in fleet_quote["quotes"]] == per_car
+    print(json.dumps({
+        "cars": args.cars,
+        "ranges": args.ranges,
+        "fleet_quote_ms": round(fleet_ms, 2),
+        "per_car_ms": round(per_car_ms, 1),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# Checks read/write splitting (db_routing.py) against two SQLite stand-ins,
+# one playing the primary and one the replica.
+#
+#   python benchmarks/replica_routing.py
+#
+# "Replication" is a copy of the primary file taken when the script says so,
+# and the replica's lag is whatever standin_db.set_replica_lag() was given,
+# so every routing decision can be forced and then observed through
+# /admin/db/pool and the data each database returns. The in-process caches
+# stay on, as in production, to check that replica reads never fill them.
+# Exits non-zero if any check fails.
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import standin_db  # noqa: E402
+
+REPLICA_HOST = "replica.standin"
+STICKY_SECONDS = 1.0
+MAX_LAG = 5
+
+
+def replicate(primary_path, replica_path):
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    source.backup(target)
+    target.close()
+    source.close()
+
+
+class Checker:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name, ok, detail=""):
+        print(f"{'PASS' if ok else 'FAIL'}  {name}{f'  ({detail})' if detail and not ok else ''}")
+        if not ok:
+            self.failures += 1
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="car-rental-replica-")
+    primary_path = os.path.join(workdir, "primary.sqlite")
+    replica_path = os.path.join(workdir, "replica.sqlite")
+    standin_db.seed(primary_path, cars=20, customers=50, rentals=200)
+    replicate(primary_path, replica_path)
+    standin_db.set_replica_lag(replica_path, 0)
+
+    os.environ.update({
+        "DB_REPLICA_HOST": REPLICA_HOST,
+        "DB_REPLICA_MAX_LAG": str(MAX_LAG),
+        "DB_REPLICA_LAG_CHECK_INTERVAL": "0",
+        "DB_REPLICA_STICKY_SECONDS": str(STICKY_SECONDS),
+        "DB_REPLICA_CHECKOUT_TIMEOUT": "0.1",
+        "DB_POOL_MAX_SIZE": "4",
+        "CHAT_WARMUP": "lazy",
+        "OVERDUE_INTERVAL_SECONDS": "0",
+        "SLOW_REQUEST_SECONDS": "0",
+    })
+    standin_db.install(primary_path, {REPLICA_HOST: replica_path})
+    import app as app_module  # noqa: E402
+
+    router = app_module.db_router
+    admin = app_module.app.test_client()
+    admin.post("/admin/login", json={"username": standin_db.ADMIN_USERNAME, "password": standin_db.ADMIN_PASSWORD})
+    # Logging in is a POST too, which makes the admin's session sticky for a moment
+    time.sleep(STICKY_SECONDS + 0.1)
+    checker = Checker()
+
+    def routed():
+        return {key: value for key, value in admin.get("/admin/db/pool").json["routing"].items()
+                if key.startswith("routed_")}
+
+    def car_ids(client):
+        # The cached catalogue
+        return {car["car_id"] for car in client.get("/api/cars").json}
+
+    def prices_between(client, start, end):
+        # The date-filtered listing reads Cars on the handler's own connection
+        cars = client.get(f"/api/cars?start={start.isoformat()}&end={end.isoformat()}").json
+        return {str(car["price_per_day"]) for car in cars}
+
+    def history_ids():
+        lines = admin.get("/admin/rentals/history?format=ndjson").get_data(as_text=True).splitlines()
+        return {json.loads(line)["rental_id"] for line in lines if line.strip()}
+
+    # Rows only the replica has tell the two databases apart
+    marker = sqlite3.connect(replica_path)
+    marker.execute("UPDATE Cars SET price_per_day = '1.23' "
+                   "WHERE car_id = (SELECT MIN(car_id) FROM Cars WHERE status = 'Available')")
+    marker.commit()
+    marker.close()
+    today = date.today()
+    later = today + timedelta(days=30)
+    reader = app_module.app.test_client()
+    checker.check("read-only route is served by the replica",
+                  "1.23" in prices_between(reader, later, later + timedelta(days=2)), routed())
+    checker.check("shared catalogue cache is filled from the primary",
+                  "1.23" not in {str(car["price_per_day"]) for car in reader.get("/api/cars").json}, routed())
+
+    before = routed()
+    admin.get("/admin/rentals/history?format=ndjson")
+    checker.check("admin reports are served by the replica",
+                  routed()["routed_replica"] == before["routed_replica"] + 1, routed())
+
+    # A write, then reads from another session and from the same one. The
+    # other session's catalogue read goes first: on the replica it would
+    # refill the shared cache with the car still listed.
+    writer = app_module.app.test_client()
+    other = app_module.app.test_client()
+    car_id = min(car_ids(writer))
+    response = writer.post("/rentals", json={"car_id": car_id, "customer_id": 1, "start_date": today.isoformat(),
+                                             "end_date": (today + timedelta(days=3)).isoformat()})
+    checker.check("rent_car succeeds on the primary", response.status_code == 200, response.get_json())
+    rental_id = response.get_json()["rental_id"]
+    before = routed()
+    car_ids(other)
+    checker.check("other session's catalogue read is routed to the replica",
+                  routed()["routed_replica"] == before["routed_replica"] + 1, routed())
+    checker.check("writer reads its own write after another session refilled the cache",
+                  car_id not in car_ids(writer), routed())
+    checker.check("writer's read was sticky", routed()["routed_sticky"] >= 1, routed())
+    checker.check("other sessions read the (not yet replicated) replica", rental_id not in history_ids())
+    checker.check("write routes never touch the replica", routed()["routed_write"] >= 1, routed())
+
+    # Statistics reconciled during a replica read still count the write
+    primary = sqlite3.connect(primary_path)
+    (ongoing,) = primary.execute("SELECT COUNT(*) FROM Rentals WHERE status = 'Ongoing'").fetchone()
+    primary.close()
+    app_module.rental_stats.mark_dirty()
+    before = routed()
+    admin.get("/admin/statistics/revenue")
+    checker.check("statistics read is routed to the replica",
+                  routed()["routed_replica"] == before["routed_replica"] + 1, routed())
+    checker.check("statistics are reconciled from the primary",
+                  not app_module.rental_stats.is_due() and app_module.rental_stats.active_rentals == ongoing,
+                  f"{app_module.rental_stats.active_rentals} != {ongoing}")
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    before = routed()
+    car_ids(writer)
+    checker.check("stickiness expires", routed()["routed_replica"] == before["routed_replica"] + 1, routed())
+
+    # Lag above the limit, and stopped replication, send reads to the primary
+    standin_db.set_replica_lag(replica_path, MAX_LAG + 10)
+    checker.check("lagging replica falls back to the primary", rental_id in history_ids(), routed())
+    standin_db.set_replica_lag(replica_path, None)
+    checker.check("stopped replication falls back to the primary", rental_id in history_ids(), routed())
+    standin_db.set_replica_lag(replica_path, 0)
+    replicate(primary_path, replica_path)
+    before = routed()
+    checker.check("caught-up replica sees the write", rental_id in history_ids(), routed())
+    checker.check("caught-up replica is used again", routed()["routed_replica"] == before["routed_replica"] + 1,
+                  routed())
+
+    # Every replica connection busy: reads still succeed, from the primary
+    held = [app_module.replica_pool.get_connection() for _ in range(app_module.replica_pool.max_size)]
+    try:
+        response = other.get("/api/cars")
+        checker.check("busy replica falls back to the primary",
+                      response.status_code == 200 and routed()["routed_replica_unavailable"] >= 1, routed())
+    finally:
+        for conn in held:
+            conn.close()
+
+    # Concurrent readers share one lag reading and never error
+    errors = []
+
+    def read():
+        client = app_module.app.test_client()
+        for _ in range(20):
+            if client.get("/api/cars").status_code != 200:
+                errors.append(1)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    checker.check("concurrent reads all succeed", not errors, f"{len(errors)} failed")
+
+    print(router.stats())
+    sys.exit(1 if checker.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
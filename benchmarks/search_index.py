@@ -0,0 +1,93 @@
+# Latency of the /admin/search index against a LIKE-style scan.
+#
+#   python benchmarks/search_index.py --customers 1000000
+#
+# Builds a synthetic customer table, indexes it with search_index.TextIndex and
+# times exact, prefix and misspelled queries. The "scan" column is a Python
+# substring scan over the same rows, a lower bound for what `LIKE '%term%'`
+# costs MySQL since it reads every row as well.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndexes, TextIndex  # noqa: E402
+
+FIRST_NAMES = ["james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda",
+               "william", "elizabeth", "david", "barbara", "richard", "susan", "joseph", "jessica",
+               "thomas", "sarah", "charles", "karen", "priya", "rahul", "ananya", "vaibhav"]
+LAST_NAMES = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis",
+              "rodriguez", "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson",
+              "sharma", "patel", "singh", "kumar", "gupta"]
+DOMAINS = ["example.com", "mail.com", "corp.example.org"]
+
+QUERIES = {
+    "exact": ["john smith", "patel", "jennifer"],
+    "prefix": ["jenn", "rodr", "vaib"],
+    "typo": ["jhon smith", "willaims", "hernadez"],
+}
+
+
+def synthetic_customers(count, rng):
+    for customer_id in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield customer_id, {
+            "first_name": first.title(),
+            "last_name": last.title(),
+            "email": f"{first}.{last}{customer_id}@{rng.choice(DOMAINS)}",
+        }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return result, samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the admin search index")
+    parser.add_argument("--customers", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = list(synthetic_customers(args.customers, rng))
+
+    index = TextIndex(SearchIndexes.CUSTOMER_FIELDS)
+    started = time.perf_counter()
+    for customer_id, row in rows:
+        index.add(customer_id, row, bulk=True)
+    index.finish_bulk()
+    print(json.dumps({"customers": args.customers, "build_s": round(time.perf_counter() - started, 2)}))
+
+    for kind, queries in QUERIES.items():
+        for query in queries:
+            hits, index_ms = timed(lambda: index.search(query, args.limit), args.repeat)
+            needle = query.split()[0]
+
+            def scan():
+                return [customer_id for customer_id, row in rows
+                        if any(needle in row[field].lower() for field in SearchIndexes.CUSTOMER_FIELDS)][:args.limit]
+
+            _, scan_ms = timed(scan, 1)
+            print(json.dumps({
+                "kind": kind,
+                "query": query,
+                "hits": len(hits),
+                "index_p50_ms": round(index_ms, 2),
+                "scan_ms": round(scan_ms, 1),
+            }))
+
+
+if __name__ == "__main__":
+    main()
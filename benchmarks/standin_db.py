@@ -0,0 +1,279 @@
+# SQLite stand-in for mysql.connector, for benchmarking app.py without a
+# MySQL server. install() registers it as the `mysql.connector` module before
+# app.py is imported; seed() creates the schema and fills it with a synthetic
+# fleet, customer base and rental history.
+#
+# Only what the app's queries need is translated: %s placeholders, START
+# TRANSACTION (taken as BEGIN IMMEDIATE, so transactions serialize the way
+# FOR UPDATE row locks would on a hot row), FOR UPDATE itself, INSERT IGNORE,
+# SHA2(), CURDATE() and GET_LOCK(), plus SHOW REPLICA STATUS for databases
+# registered with set_replica_lag(). SQLite locks the whole database for
+# writes, so write heavy numbers are a lower bound for what MySQL would do.
+import hashlib
+import random
+import re
+import sqlite3
+import sys
+import types
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+SCHEMA = """
+CREATE TABLE Customers (
+    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    email VARCHAR(100) UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    phone VARCHAR(15),
+    address VARCHAR(255)
+);
+CREATE TABLE Admins (
+    admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+CREATE TABLE Cars (
+    car_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model VARCHAR(50),
+    make VARCHAR(50),
+    year INT,
+    registration_number VARCHAR(20) UNIQUE,
+    status VARCHAR(20) DEFAULT 'Available',
+    price_per_day DECIMAL(10, 2)
+);
+CREATE TABLE Rentals (
+    rental_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INT REFERENCES Customers(customer_id) ON DELETE CASCADE,
+    car_id INT REFERENCES Cars(car_id) ON DELETE CASCADE,
+    start_date DATE,
+    end_date DATE,
+    total_cost DECIMAL(10, 2),
+    status VARCHAR(20) DEFAULT 'Ongoing',
+    overdue_since DATE NULL
+);
+CREATE TABLE Payments (
+    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rental_id INT REFERENCES Rentals(rental_id) ON DELETE CASCADE,
+    amount DECIMAL(10, 2),
+    payment_date DATE,
+    payment_method VARCHAR(50)
+);
+CREATE INDEX idx_rentals_status_start ON Rentals (status, start_date);
+CREATE INDEX idx_rentals_car_start ON Rentals (car_id, start_date);
+CREATE INDEX idx_rentals_customer_start ON Rentals (customer_id, start_date);
+CREATE INDEX idx_rentals_start ON Rentals (start_date);
+CREATE INDEX idx_cars_status_price ON Cars (status, price_per_day);
+CREATE INDEX idx_rentals_status_end ON Rentals (status, end_date);
+"""
+
+ADMIN_USERNAME = "bench-admin"
+ADMIN_PASSWORD = "bench-admin"
+MODELS = [("Civic", "Honda"), ("Corolla", "Toyota"), ("Model 3", "Tesla"), ("Golf", "Volkswagen"),
+          ("Swift", "Suzuki"), ("Creta", "Hyundai"), ("Mustang", "Ford"), ("3 Series", "BMW")]
+
+_PLACEHOLDER = re.compile(r"%s")
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"^\s*INSERT\s+IGNORE\b", re.IGNORECASE)
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class PoolError(Error):
+    pass
+
+
+# path -> Seconds_Behind_Source reported by SHOW REPLICA STATUS (None for
+# stopped replication); other databases answer like a primary, with no rows
+_replica_lag = {}
+
+
+def set_replica_lag(path, seconds):
+    _replica_lag[path] = seconds
+
+
+def _translate(sql):
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _FOR_UPDATE.sub("", sql)
+    return _INSERT_IGNORE.sub("INSERT OR IGNORE", sql)
+
+
+def _wrap_errors(fn, *args):
+    try:
+        return fn(*args)
+    except sqlite3.IntegrityError as e:
+        raise IntegrityError(str(e))
+    except sqlite3.OperationalError as e:
+        raise OperationalError(str(e))
+    except sqlite3.Error as e:
+        raise DatabaseError(str(e))
+
+
+class Cursor:
+    def __init__(self, conn, dictionary):
+        self._conn = conn
+        self._cursor = conn._sqlite.cursor()
+        self._dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+        self.column_names = ()
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row if row is None else tuple(row)
+        return dict(zip(self.column_names, row))
+
+    def execute(self, operation, params=()):
+        statement = operation.strip().rstrip(";").upper()
+        if statement == "START TRANSACTION":
+            if not self._conn.in_transaction:
+                _wrap_errors(self._cursor.execute, "BEGIN IMMEDIATE")
+            return
+        if statement in ("COMMIT", "ROLLBACK"):
+            if self._conn.in_transaction:
+                _wrap_errors(self._cursor.execute, statement)
+            return
+        if statement == "SHOW REPLICA STATUS":
+            if self._conn.path in _replica_lag:
+                operation, params = "SELECT ? AS Seconds_Behind_Source", (_replica_lag[self._conn.path],)
+            else:
+                operation, params = "SELECT NULL AS Seconds_Behind_Source WHERE 0", ()
+        _wrap_errors(self._cursor.execute, _translate(operation), tuple(params or ()))
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+        self.column_names = tuple(d[0] for d in self._cursor.description or ())
+
+    def executemany(self, operation, seq_params):
+        _wrap_errors(self._cursor.executemany, _translate(operation), [tuple(p) for p in seq_params])
+        self.rowcount = self._cursor.rowcount
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        self.path = path
+        self._sqlite = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False,
+                                       detect_types=sqlite3.PARSE_DECLTYPES)
+        self._sqlite.execute("PRAGMA busy_timeout = 30000")
+        self._sqlite.execute("PRAGMA foreign_keys = ON")
+        self._sqlite.create_function("SHA2", 2, lambda value, bits: hashlib.sha256(str(value).encode()).hexdigest())
+        self._sqlite.create_function("CURDATE", 0, lambda: date.today().isoformat())
+        # A single process holds every named lock
+        self._sqlite.create_function("GET_LOCK", 2, lambda name, timeout: 1)
+        self._sqlite.create_function("RELEASE_LOCK", 1, lambda name: 1)
+
+    @property
+    def in_transaction(self):
+        return self._sqlite.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None):
+        return Cursor(self, dictionary)
+
+    def commit(self):
+        if self._sqlite.in_transaction:
+            self._sqlite.execute("COMMIT")
+
+    def rollback(self):
+        if self._sqlite.in_transaction:
+            self._sqlite.execute("ROLLBACK")
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._sqlite.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._sqlite.close()
+
+
+def _register_types():
+    sqlite3.register_adapter(Decimal, str)
+    sqlite3.register_adapter(date, lambda value: value.isoformat())
+    sqlite3.register_adapter(datetime, lambda value: value.date().isoformat())
+    sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()[:10]))
+    sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()).quantize(Decimal("0.01")))
+
+
+def install(path, hosts=None):
+    # Makes `import mysql.connector` resolve to this stand-in, connected to
+    # the SQLite database at `path`, or at hosts[host] for hosts listed there
+    _register_types()
+    errors = types.ModuleType("mysql.connector.errors")
+    for cls in (Error, DatabaseError, OperationalError, IntegrityError, ProgrammingError, PoolError):
+        setattr(errors, cls.__name__, cls)
+    connector = types.ModuleType("mysql.connector")
+    connector.errors = errors
+    connector.Error = Error
+    connector.connect = lambda **settings: Connection((hosts or {}).get(settings.get("host"), path))
+    mysql = types.ModuleType("mysql")
+    mysql.connector = connector
+    sys.modules.update({"mysql": mysql, "mysql.connector": connector, "mysql.connector.errors": errors})
+
+
+def seed(path, cars=500, customers=10000, rentals=50000, seed=0):
+    _register_types()
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript(SCHEMA)
+    conn.execute("BEGIN")
+    conn.execute("INSERT INTO Admins (username, password) VALUES (?, ?)",
+                 (ADMIN_USERNAME, hashlib.sha256(ADMIN_PASSWORD.encode()).hexdigest()))
+    conn.executemany(
+        "INSERT INTO Cars (model, make, year, registration_number, status, price_per_day) VALUES (?, ?, ?, ?, ?, ?)",
+        ((*rng.choice(MODELS), rng.randint(2015, 2025), f"BENCH{car_id:06d}",
+          "Under Maintenance" if rng.random() < 0.05 else "Available",
+          str(Decimal(rng.randint(3000, 15000)) / 100)) for car_id in range(1, cars + 1)))
+    password = hashlib.sha256(b"password").hexdigest()
+    conn.executemany(
+        "INSERT INTO Customers (first_name, last_name, email, password, phone, address) VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"First{n}", f"Last{n}", f"customer{n}@example.com", password, f"555{n:07d}", f"{n} Bench Street")
+         for n in range(1, customers + 1)))
+
+    # Completed history over the past two years; no ongoing rentals, so the
+    # contended scenario starts from a free car
+    today = date.today()
+
+    def history():
+        for _ in range(rentals):
+            start = today - timedelta(days=rng.randint(2, 730))
+            days = rng.randint(1, 14)
+            yield (rng.randint(1, customers), rng.randint(1, cars), start.isoformat(),
+                   (start + timedelta(days=days)).isoformat(), str(Decimal(days * rng.randint(30, 150))),
+                   "Completed" if rng.random() < 0.95 else "Cancelled")
+
+    conn.executemany(
+        "INSERT INTO Rentals (customer_id, car_id, start_date, end_date, total_cost, status) VALUES (?, ?, ?, ?, ?, ?)",
+        history())
+    conn.execute("COMMIT")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
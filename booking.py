@@ -0,0 +1,150 @@
+import logging
+import os
+import random
+import time
+from datetime import date
+
+from mysql.connector import errors
+
+from availability import check_overlap
+from metrics import metrics
+from quote_engine import quote_engine
+
+# Single-car bookings for rent_car, in one of two modes.
+#
+# 'locking' takes the car's row with SELECT ... FOR UPDATE and holds it while
+# checking, pricing and inserting. 'optimistic' reads and prices the car
+# without a lock and then claims it with one conditional
+#   UPDATE Cars SET status = 'Rented' WHERE car_id = ? AND status = 'Available'
+# checking the affected row count, so when a popular car is released only the
+# winner's short transaction touches the row and everyone else fails fast on
+# the plain read once the car shows as Rented. The claim also matches on the
+# price that was quoted, so a concurrent price change makes the claim miss
+# and the booking is re-quoted. Reservations that start in the future do not
+# change the car's status, so they always go through the locking path.
+#
+# Both modes retry the whole transaction with jittered exponential backoff on
+# deadlocks and lock wait timeouts.
+MODE = os.environ.get("BOOKING_MODE", "locking")
+MODES = ("locking", "optimistic")
+RETRY_ATTEMPTS = int(os.environ.get("BOOKING_RETRY_ATTEMPTS", 4))
+RETRY_BASE_MS = float(os.environ.get("BOOKING_RETRY_BASE_MS", 10))
+RETRY_MAX_MS = float(os.environ.get("BOOKING_RETRY_MAX_MS", 200))
+# ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK
+RETRYABLE_ERRNOS = (1205, 1213)
+# Claims that miss because the price changed under us before giving up
+MAX_REQUOTES = 3
+
+if MODE not in MODES:
+    raise ValueError(f"BOOKING_MODE must be one of {', '.join(MODES)}")
+
+
+class BookingRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Booking:
+    def __init__(self, rental_id, car_id, total_cost, starts_now):
+        self.rental_id = rental_id
+        self.car_id = car_id
+        self.total_cost = total_cost
+        self.starts_now = starts_now
+
+
+def is_retryable(e):
+    return isinstance(e, errors.Error) and getattr(e, "errno", None) in RETRYABLE_ERRNOS
+
+
+def with_lock_retry(conn, attempt, attempts=RETRY_ATTEMPTS, base_ms=RETRY_BASE_MS, max_ms=RETRY_MAX_MS):
+    # Runs attempt() until it gets past deadlocks and lock wait timeouts;
+    # anything else, and the last retryable error, propagates
+    for n in range(1, attempts + 1):
+        try:
+            return attempt()
+        except errors.Error as e:
+            if not is_retryable(e) or n == attempts:
+                raise
+            conn.rollback()
+            metrics.inc("booking_lock_retries_total", errno=str(e.errno))
+            delay = random.uniform(0, min(max_ms, base_ms * 2 ** (n - 1)))
+            logging.info(f"Booking retry {n} after {str(e)}; sleeping {delay:.0f}ms")
+            time.sleep(delay / 1000.0)
+
+
+def book(cursor, customer_id, car_id, start, end, mode=None):
+    starts_now = start <= date.today()
+    if (mode or MODE) == "optimistic" and starts_now:
+        return book_optimistic(cursor, customer_id, car_id, start, end)
+    return book_locking(cursor, customer_id, car_id, start, end)
+
+
+def _insert_rental(cursor, customer_id, car_id, start, end, total_cost):
+    cursor.execute("""
+        INSERT INTO Rentals (customer_id, car_id, start_date, end_date, total_cost, status)
+        VALUES (%s, %s, %s, %s, %s, 'Ongoing')
+    """, (customer_id, car_id, start, end, total_cost))
+    return cursor.lastrowid
+
+
+def book_locking(cursor, customer_id, car_id, start, end):
+    cursor.execute("START TRANSACTION")
+
+    cursor.execute("SELECT car_id, price_per_day, status FROM Cars WHERE car_id = %s FOR UPDATE", (car_id,))
+    car = cursor.fetchone()
+    if not car:
+        cursor.execute("ROLLBACK")
+        raise BookingRejected("Car not found", 404)
+    starts_now = start <= date.today()
+    # Future reservations only need the dates to be free; a rental starting
+    # today also needs the car to actually be on the lot
+    if car['status'] == 'Under Maintenance' or (starts_now and car['status'] != 'Available'):
+        cursor.execute("ROLLBACK")
+        raise BookingRejected("Car is not available")
+    car_id = car['car_id']
+    if check_overlap(cursor, car_id, start, end):
+        cursor.execute("ROLLBACK")
+        raise BookingRejected("Car is already booked for those dates")
+
+    total_cost = quote_engine.price(car['price_per_day'], start, end)
+    rental_id = _insert_rental(cursor, customer_id, car_id, start, end, total_cost)
+    if starts_now:
+        cursor.execute("UPDATE Cars SET status = 'Rented' WHERE car_id = %s", (car_id,))
+
+    cursor.execute("COMMIT")
+    return Booking(rental_id, car_id, total_cost, starts_now)
+
+
+def book_optimistic(cursor, customer_id, car_id, start, end):
+    # Only for rentals starting today, which take the car off the lot
+    for _ in range(MAX_REQUOTES):
+        cursor.execute("SELECT car_id, price_per_day, status FROM Cars WHERE car_id = %s", (car_id,))
+        car = cursor.fetchone()
+        if not car:
+            raise BookingRejected("Car not found", 404)
+        car_id = car['car_id']
+        if car['status'] != 'Available':
+            raise BookingRejected("Car is not available")
+        total_cost = quote_engine.price(car['price_per_day'], start, end)
+
+        cursor.execute("START TRANSACTION")
+        cursor.execute("""
+            UPDATE Cars SET status = 'Rented'
+            WHERE car_id = %s AND status = 'Available' AND price_per_day = %s
+        """, (car_id, car['price_per_day']))
+        if cursor.rowcount != 1:
+            # Somebody else got the car, or its price changed; the next read says which
+            cursor.execute("ROLLBACK")
+            metrics.inc("booking_claims_missed_total")
+            continue
+        # The claim holds the car's row lock, so reservations made through the
+        # locking path cannot slip in before this check
+        if check_overlap(cursor, car_id, start, end):
+            cursor.execute("ROLLBACK")
+            raise BookingRejected("Car is already booked for those dates")
+        rental_id = _insert_rental(cursor, customer_id, car_id, start, end, total_cost)
+        cursor.execute("COMMIT")
+        return Booking(rental_id, car_id, total_cost, True)
+    raise BookingRejected("Car is not available")
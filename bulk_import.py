@@ -0,0 +1,193 @@
+import csv
+import hashlib
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+# Bulk CSV / NDJSON import for cars and customers. Records are read from the
+# request stream one at a time, validated, and written as multi-row INSERTs of
+# CHUNK_SIZE rows, each chunk in its own transaction. A chunk the database
+# rejects is retried row by row so only the offending rows are reported.
+# Cars are keyed by registration_number. Re-importing a car updates its
+# details but never its status: that belongs to the rental and maintenance
+# flows, and a file (or a missing status column defaulting to Available)
+# would otherwise put rented cars back on the lot. status only applies to
+# new cars.
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+DUPLICATE_MODES = ("update", "skip", "error")
+CAR_STATUSES = ("Available", "Rented", "Under Maintenance")
+
+
+class ImportSpec:
+    def __init__(self, table, columns, key, validate, updatable):
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.validate = validate
+        self.updatable = updatable
+
+    def insert_sql(self, rows, on_duplicate):
+        placeholders = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        sql = (f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+               + ", ".join([placeholders] * rows))
+        if on_duplicate == "update":
+            sql += " ON DUPLICATE KEY UPDATE " + ", ".join(self.updatable)
+        elif on_duplicate == "skip":
+            sql += f" ON DUPLICATE KEY UPDATE {self.key} = {self.key}"
+        return sql
+
+
+def _required(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        raise ValueError(f"{field} is required")
+    return str(value).strip()
+
+
+def _optional(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return None
+    return str(value).strip()
+
+
+def validate_car(record):
+    year = _required(record, "year")
+    try:
+        year = int(year)
+    except ValueError:
+        raise ValueError("year must be an integer")
+    price = _required(record, "price_per_day")
+    try:
+        price = Decimal(price)
+    except InvalidOperation:
+        raise ValueError("price_per_day must be a number")
+    if price < 0:
+        raise ValueError("price_per_day must not be negative")
+    status = _optional(record, "status") or "Available"
+    if status not in CAR_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(CAR_STATUSES)}")
+    return (_required(record, "model"), _optional(record, "make"), year,
+            _required(record, "registration_number"), status, price)
+
+
+def validate_customer(record):
+    email = _required(record, "email").lower()
+    if "@" not in email:
+        raise ValueError("email is invalid")
+    # Same digest as MySQL's SHA2(password, 256); customers imported without
+    # a password get an empty hash and cannot log in until one is set
+    password = _optional(record, "password")
+    hashed = hashlib.sha256(password.encode("utf-8")).hexdigest() if password else ""
+    return (_required(record, "first_name"), _required(record, "last_name"), email,
+            hashed, _optional(record, "phone"), _optional(record, "address"))
+
+
+CARS = ImportSpec(
+    "Cars",
+    ("model", "make", "year", "registration_number", "status", "price_per_day"),
+    "registration_number",
+    validate_car,
+    ["model = VALUES(model)", "make = VALUES(make)", "year = VALUES(year)",
+     "price_per_day = VALUES(price_per_day)"],
+)
+
+CUSTOMERS = ImportSpec(
+    "Customers",
+    ("first_name", "last_name", "email", "password", "phone", "address"),
+    "email",
+    validate_customer,
+    ["first_name = VALUES(first_name)", "last_name = VALUES(last_name)",
+     "password = IF(VALUES(password) = '', password, VALUES(password))",
+     "phone = VALUES(phone)", "address = VALUES(address)"],
+)
+
+
+def iter_records(stream, content_type):
+    # Yields (line_number, record_or_None, error_or_None)
+    text = (line.decode("utf-8", errors="replace") for line in stream)
+    if "csv" in content_type:
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, "invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "each line must be a JSON object"
+            continue
+        yield line_number, record, None
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.written = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def as_dict(self):
+        return {
+            "processed": self.processed,
+            "written": self.written,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _write_chunk(cursor, conn, spec, chunk, on_duplicate, result):
+    params = [value for _, row in chunk for value in row]
+    try:
+        cursor.execute(spec.insert_sql(len(chunk), on_duplicate), params)
+        conn.commit()
+        result.written += len(chunk)
+        return
+    except mysql.connector.Error as e:
+        conn.rollback()
+        logging.info(f"Import chunk of {len(chunk)} rows rejected, retrying row by row: {str(e)}")
+
+    for line_number, row in chunk:
+        try:
+            cursor.execute(spec.insert_sql(1, on_duplicate), row)
+            conn.commit()
+            result.written += 1
+        except mysql.connector.Error as e:
+            conn.rollback()
+            result.error(line_number, str(e))
+
+
+def import_records(cursor, conn, spec, records, on_duplicate="update", chunk_size=CHUNK_SIZE):
+    result = ImportResult()
+    chunk = []
+    for line_number, record, parse_error in records:
+        result.processed += 1
+        if parse_error:
+            result.error(line_number, parse_error)
+            continue
+        try:
+            chunk.append((line_number, spec.validate(record)))
+        except ValueError as e:
+            result.error(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _write_chunk(cursor, conn, spec, chunk, on_duplicate, result)
+            chunk = []
+    if chunk:
+        _write_chunk(cursor, conn, spec, chunk, on_duplicate, result)
+    return result
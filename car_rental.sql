@@ -1,4 +1,6 @@
 -- Active: 1742816071690@@127.0.0.1@3306@car_rental
+-- Scratch script kept for reference. The schema, seed data and indexes are
+-- applied by the versioned files in migrations/ (python migrate.py).
 CREATE TABLE Customers (
     customer_id INT PRIMARY KEY AUTO_INCREMENT,
     first_name VARCHAR(50),
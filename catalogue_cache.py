@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from chat_cache import QueryCache
+
+# Read-through cache for the public car catalogue. Every write path that can
+# change the listing calls invalidate(), which bumps the version and drops the
+# cached rows and rendered pages. Writes made by other worker processes are not
+# seen here, so entries also expire after CATALOGUE_CACHE_TTL seconds.
+CACHE_TTL = float(os.environ.get("CATALOGUE_CACHE_TTL", 30))
+CACHE_HTML = os.environ.get("CATALOGUE_CACHE_HTML", "1") == "1"
+
+
+class CatalogueEntry:
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.loaded_at = time.monotonic()
+        payload = json.dumps(rows, default=str, sort_keys=True)
+        # Content based so that every worker hands out the same tag for the same listing
+        self.etag = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class CatalogueCache:
+    def __init__(self, ttl=CACHE_TTL, cache_html=CACHE_HTML):
+        self.ttl = ttl
+        self.cache_html = cache_html
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entry = None
+        self._pages = QueryCache(max_entries=256, max_bytes=8 * 1024 * 1024, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, load):
+        # load(): fetches the available cars from the database on a miss
+        entry = self._entry
+        if entry is not None and entry.version == self.version and time.monotonic() - entry.loaded_at < self.ttl:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        version = self.version
+        entry = CatalogueEntry(version, load())
+        with self._lock:
+            # Don't store rows read before a concurrent invalidate()
+            if version == self.version:
+                self._entry = entry
+        return entry
+
+    def get_page(self, entry, variant):
+        if not self.cache_html:
+            return None
+        return self._pages.get(f"{entry.etag}:{variant}")
+
+    def put_page(self, entry, variant, html):
+        if self.cache_html and entry.version == self.version:
+            self._pages.put(f"{entry.etag}:{variant}", html)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entry = None
+        self._pages.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "pages": self._pages.stats(),
+        }
+
+
+catalogue_cache = CatalogueCache()
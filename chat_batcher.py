@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+
+class _PendingSearch:
+    __slots__ = ("kb", "text", "k", "result", "error", "done")
+
+    def __init__(self, kb, text, k):
+        self.kb = kb
+        self.text = text
+        self.k = k
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SearchBatcher:
+    # Coalesces concurrent chat lookups: the worker thread waits up to max_wait
+    # seconds for more requests after the first one arrives, encodes the whole
+    # batch with a single embedder call and runs one index.search per snapshot.
+    def __init__(self, encode, max_batch_size=32, max_wait=0.005):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chat-batcher", daemon=True)
+                self._thread.start()
+
+    def search(self, kb, text, k=1, timeout=10.0):
+        # Returns (distances, indices) for one query, like a row of index.search
+        pending = _PendingSearch(kb, text, k)
+        self._ensure_started()
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for batched search")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            with metrics.timer("chat_embed_seconds", mode="batched"):
+                embeddings = self.encode([pending.text for pending in batch])
+
+            # Requests racing a reload may hold different snapshots
+            groups = {}
+            for row, pending in enumerate(batch):
+                groups.setdefault((id(pending.kb), pending.k), []).append(row)
+
+            for rows in groups.values():
+                first = batch[rows[0]]
+                with metrics.timer("chat_faiss_search_seconds", mode="batched"):
+                    distances, indices = first.kb.index.search(embeddings[rows], first.k)
+                for i, row in enumerate(rows):
+                    batch[row].result = (distances[i], indices[i])
+
+            self.batches += 1
+            self.items += len(batch)
+        except Exception as e:
+            logging.error(f"Batched chat search failed: {str(e)}")
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
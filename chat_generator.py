@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+import time
+
+from metrics import metrics
+
+# Optional generative answers. distilgpt2 is conditioned on the top retrieved
+# knowledge base answers and paraphrases them. On CPU the model runs with its
+# linear layers dynamically quantized to int8, decodes one token at a time
+# against the KV cache, and is held to a token budget and a wall-clock budget
+# per request. Whenever a budget runs out, or the model is busy or not loaded,
+# the caller gets the retrieved answer instead, so enabling this can only make
+# answers slower by at most the time budget.
+GENERATION_ENABLED = os.environ.get("CHAT_GENERATION", "0") == "1"
+GENERATION_MODEL_NAME = os.environ.get("CHAT_GENERATION_MODEL", "distilgpt2")
+QUANTIZE = os.environ.get("CHAT_GENERATION_QUANTIZE", "1") == "1"
+MAX_NEW_TOKENS = int(os.environ.get("CHAT_GENERATION_MAX_NEW_TOKENS", 60))
+TIME_BUDGET_MS = float(os.environ.get("CHAT_GENERATION_TIME_BUDGET_MS", 2000))
+FIRST_TOKEN_BUDGET_MS = float(os.environ.get("CHAT_GENERATION_FIRST_TOKEN_MS", 500))
+CONTEXTS = int(os.environ.get("CHAT_GENERATION_CONTEXTS", 2))
+# Generations running at once; more requests than this fall back immediately
+CONCURRENCY = int(os.environ.get("CHAT_GENERATION_CONCURRENCY", 1))
+TORCH_THREADS = int(os.environ.get("CHAT_GENERATION_THREADS", 0))  # 0 keeps torch's default
+MIN_ANSWER_CHARS = 20
+
+PROMPT = (
+    "You are a helpful assistant for a car rental company. Answer the customer's "
+    "question in one or two sentences using only the information below.\n\n"
+    "Information:\n{contexts}\n\n"
+    "Question: {question}\n"
+    "Answer:"
+)
+
+
+class Token:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Done:
+    # Final event of a generation: the answer to show and where it came from
+    __slots__ = ("response", "source", "reason", "tokens", "seconds")
+
+    def __init__(self, response, source, reason, tokens=0, seconds=0.0):
+        self.response = response
+        self.source = source
+        self.reason = reason
+        self.tokens = tokens
+        self.seconds = seconds
+
+    def as_dict(self):
+        return {
+            "response": self.response,
+            "source": self.source,
+            "reason": self.reason,
+            "tokens": self.tokens,
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def _linear_from_conv1d(conv):
+    # transformers' GPT-2 uses Conv1D (weight stored in x out) where other
+    # models use nn.Linear; quantize_dynamic only knows about the latter
+    import torch
+
+    linear = torch.nn.Linear(conv.weight.shape[0], conv.weight.shape[1])
+    linear.weight = torch.nn.Parameter(conv.weight.detach().t().contiguous())
+    linear.bias = torch.nn.Parameter(conv.bias.detach().clone())
+    return linear
+
+
+def _swap_conv1d(module):
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            setattr(module, name, _linear_from_conv1d(child))
+        else:
+            _swap_conv1d(child)
+
+
+class AnswerGenerator:
+    COLD = "cold"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, enabled=GENERATION_ENABLED, model_name=GENERATION_MODEL_NAME, quantize=QUANTIZE,
+                 max_new_tokens=MAX_NEW_TOKENS, time_budget=TIME_BUDGET_MS / 1000.0,
+                 first_token_budget=FIRST_TOKEN_BUDGET_MS / 1000.0, contexts=CONTEXTS, concurrency=CONCURRENCY):
+        self.enabled = enabled
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_new_tokens = max_new_tokens
+        self.time_budget = time_budget
+        self.first_token_budget = first_token_budget
+        self.contexts = contexts
+        self.status = self.COLD
+        self.error = None
+        self.timings = {}
+        self.tokenizer = None
+        self.model = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+
+    def is_ready(self):
+        return self.status == self.READY
+
+    def start_warmup(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.status != self.COLD:
+                return
+            self.status = self.LOADING
+        threading.Thread(target=self._load, name="chat-generator-warmup", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+
+            if TORCH_THREADS:
+                torch.set_num_threads(TORCH_THREADS)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            model.eval()
+            self.timings["load"] = round(time.perf_counter() - started, 4)
+            if self.quantize:
+                quantize_started = time.perf_counter()
+                _swap_conv1d(model)
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                self.timings["quantize"] = round(time.perf_counter() - quantize_started, 4)
+            self.tokenizer, self.model = tokenizer, model
+            self.status = self.READY
+            logging.info(f"Chat generator ready in {self.timings}")
+        except Exception as e:
+            logging.error(f"Chat generator loading failed: {str(e)}")
+            self.error = str(e)
+            self.status = self.FAILED
+
+    def _prompt_ids(self, question, contexts):
+        # Drops the lowest ranked contexts until the prompt leaves room for
+        # max_new_tokens inside the model's window
+        limit = self.tokenizer.model_max_length - self.max_new_tokens
+        while True:
+            text = PROMPT.format(contexts="\n".join(f"- {context}" for context in contexts), question=question)
+            ids = self.tokenizer.encode(text)
+            if len(ids) <= limit or len(contexts) <= 1:
+                return ids[-limit:]
+            contexts = contexts[:-1]
+
+    def stream(self, question, contexts, fallback):
+        # Yields Token events as text is produced and always ends with a Done
+        # event. fallback is what to answer with when generation cannot.
+        started = time.perf_counter()
+        if not self.is_ready():
+            yield Done(fallback, "retrieval", "generator_not_ready")
+            return
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("chat_generation_total", outcome="busy")
+            yield Done(fallback, "retrieval", "generator_busy")
+            return
+        try:
+            yield from self._generate(question, contexts, fallback, started)
+        finally:
+            self._slots.release()
+
+    def _generate(self, question, contexts, fallback, started):
+        import torch
+
+        tokenizer, model = self.tokenizer, self.model
+        generated = []
+        text = ""
+        reason = "max_tokens"
+        with torch.inference_mode():
+            input_ids = torch.tensor([self._prompt_ids(question, contexts)])
+            output = model(input_ids=input_ids, use_cache=True)
+            for _ in range(self.max_new_tokens):
+                elapsed = time.perf_counter() - started
+                if elapsed > self.time_budget or (not generated and elapsed > self.first_token_budget):
+                    reason = "time_budget"
+                    break
+                next_id = int(output.logits[0, -1].argmax())
+                if next_id == tokenizer.eos_token_id:
+                    reason = "eos"
+                    break
+                generated.append(next_id)
+                if len(generated) == 1:
+                    metrics.observe("chat_generation_first_token_seconds", time.perf_counter() - started)
+                decoded = tokenizer.decode(generated, skip_special_tokens=True)
+                # One line is one answer; the model tends to invent a next question
+                if "\n" in decoded:
+                    decoded = decoded.split("\n", 1)[0]
+                    reason = "end_of_line"
+                if len(decoded) > len(text):
+                    yield Token(decoded[len(text):])
+                    text = decoded
+                if reason == "end_of_line":
+                    break
+                # Only the new token is fed back; earlier positions come from the KV cache
+                output = model(input_ids=torch.tensor([[next_id]]), past_key_values=output.past_key_values,
+                               use_cache=True)
+
+        seconds = time.perf_counter() - started
+        metrics.observe("chat_generation_seconds", seconds)
+        answer = text.strip()
+        if reason == "time_budget" or len(answer) < MIN_ANSWER_CHARS:
+            outcome = "time_budget" if reason == "time_budget" else "too_short"
+            metrics.inc("chat_generation_total", outcome=outcome)
+            yield Done(fallback, "retrieval", outcome, len(generated), seconds)
+            return
+        metrics.inc("chat_generation_total", outcome="generated")
+        yield Done(answer, "generated", reason, len(generated), seconds)
+
+    def answer(self, question, contexts, fallback):
+        # Non-streaming form: the final Done event
+        for event in self.stream(question, contexts, fallback):
+            if isinstance(event, Done):
+                return event
+        return Done(fallback, "retrieval", "no_result")
+
+    def state(self):
+        return {"enabled": self.enabled, "status": self.status, "error": self.error, "timings": dict(self.timings)}
+
+
+answer_generator = AnswerGenerator()
@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chatbot
+from chat_generator import Done, Token
+
+# Shared chat model server. Run it once per host:
+#   CHAT_SERVER_SOCKET=/run/car-rental/chat.sock python chat_server.py
+# and start the web workers with the same CHAT_SERVER_SOCKET. The embedder,
+# FAISS index, answers and the optional generator are then loaded only in
+# this process, and workers forward /chat to it over the Unix socket.
+# Requests from every worker go through this process's SearchBatcher, so
+# concurrent questions are encoded and searched together whichever worker
+# they came from.
+#
+# Protocol: each frame is a 4-byte big-endian length followed by that many
+# bytes of UTF-8 JSON. A client sends one request frame and reads the reply
+# frames, after which the connection can carry its next request. A reply
+# frame is {"ok": body}, or {"error": message, "status": http_status} when
+# the request failed:
+#   {"op": "reply", "message": "..."}   -> the /chat JSON body
+#   {"op": "reply", "messages": [...]}  -> {"replies": [body, ...]}
+#   {"op": "stream", "message": "..."}  -> {"event": "token", "text": ...} frames,
+#                                          then {"event": "done", "response": ..., ...}
+#   {"op": "state"}                     -> the /chat/status body
+#   {"op": "reload"}                    -> the knowledge base reload summary
+SOCKET_PATH = os.environ.get("CHAT_SERVER_SOCKET", "")
+TIMEOUT = float(os.environ.get("CHAT_SERVER_TIMEOUT", 10))
+# A reload re-encodes every new or reworded question, so it gets far longer
+RELOAD_TIMEOUT = float(os.environ.get("CHAT_SERVER_RELOAD_TIMEOUT", 600))
+CLIENT_MAX_IDLE = int(os.environ.get("CHAT_SERVER_CLIENT_CONNECTIONS", 8))
+SERVER_THREADS = int(os.environ.get("CHAT_SERVER_THREADS", 32))
+MAX_BATCH_MESSAGES = 64
+MAX_FRAME_BYTES = 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+class ChatServerError(Exception):
+    # status is the HTTP status the web app should answer with
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+
+
+def send_frame(sock, payload):
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame" if chunks else "Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes is over the {MAX_FRAME_BYTES} byte limit")
+    return json.loads(_recv_exactly(sock, size).decode("utf-8"))
+
+
+class ChatServerClient:
+    # Used by the web workers. Keeps up to max_idle connections open for
+    # reuse; each carries one request at a time.
+    def __init__(self, path, timeout=TIMEOUT, max_idle=CLIENT_MAX_IDLE, reload_timeout=RELOAD_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.reload_timeout = reload_timeout
+        self.max_idle = max_idle
+        self.requests = 0
+        self.failures = 0
+        self.connects = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        with self._lock:
+            self.connects += 1
+        return sock
+
+    def _checkout(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _checkin(self, sock):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def _frames(self, request, timeout=None):
+        # Yields the reply frames to `request`, waiting up to `timeout`
+        # (default self.timeout) for each. A pooled connection the server
+        # has since closed gets one retry on a fresh connection, as long as
+        # nothing has been received on it yet.
+        with self._lock:
+            self.requests += 1
+        try:
+            sock, reused = self._checkout()
+        except OSError as e:
+            self._failed()
+            raise ChatServerError(f"Cannot connect to chat server at {self.path}: {str(e)}")
+        try:
+            while True:
+                try:
+                    sock.settimeout(timeout or self.timeout)
+                    send_frame(sock, request)
+                    frame = recv_frame(sock)
+                    break
+                except ConnectionError:
+                    sock.close()
+                    if not reused:
+                        raise
+                    sock, reused = self._connect(), False
+            while True:
+                if "error" in frame:
+                    raise ChatServerError(f"Chat server error: {frame['error']}", frame["status"])
+                body = frame["ok"]
+                yield body
+                if request["op"] != "stream" or body["event"] == "done":
+                    break
+                frame = recv_frame(sock)
+        except ChatServerError:
+            self._failed()
+            sock.settimeout(self.timeout)
+            self._checkin(sock)
+            raise
+        except (OSError, ValueError, KeyError) as e:
+            # Includes socket.timeout; the connection may still get a late
+            # reply, so it is not reused
+            sock.close()
+            self._failed()
+            raise ChatServerError(f"Chat server request failed: {str(e) or type(e).__name__}")
+        except GeneratorExit:
+            # The caller stopped reading mid-stream
+            sock.close()
+            raise
+        else:
+            sock.settimeout(self.timeout)
+            self._checkin(sock)
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+
+    def _call(self, request, timeout=None):
+        # Read to the end so the connection goes back to the pool
+        return list(self._frames(request, timeout))[0]
+
+    def reply(self, message):
+        return self._call({"op": "reply", "message": message})
+
+    def reply_many(self, messages):
+        return self._call({"op": "reply", "messages": list(messages)})["replies"]
+
+    def stream(self, message):
+        # Token / Done events, like chatbot.stream_response
+        for body in self._frames({"op": "stream", "message": message}):
+            if body["event"] == "token":
+                yield Token(body["text"])
+            else:
+                yield Done(body["response"], body["source"], body["reason"], body.get("tokens", 0),
+                           body.get("seconds", 0.0))
+
+    def state(self):
+        return self._call({"op": "state"})
+
+    def reload(self):
+        return self._call({"op": "reload"}, self.reload_timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "connects": self.connects,
+                "idle_connections": len(self._idle),
+            }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    # One thread per client connection, serving its requests in turn
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                logging.error(f"Bad chat server frame: {str(e)}")
+                return
+            try:
+                for body in self.server.dispatch(request):
+                    send_frame(self.request, {"ok": body})
+            except OSError:
+                return
+            except Exception as e:
+                status = e.status if isinstance(e, ChatServerError) else 500
+                if status >= 500:
+                    logging.error(f"Chat server error: {str(e)}")
+                try:
+                    send_frame(self.request, {"error": str(e), "status": status})
+                except OSError:
+                    return
+
+
+class ChatServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Every web worker thread may connect at once when the server (re)starts
+    request_queue_size = 256
+
+    def __init__(self, path, threads=SERVER_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="chat-server")
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # Left behind by a previous run
+                os.unlink(path)
+            else:
+                raise RuntimeError(f"A chat server is already listening on {path}")
+            finally:
+                probe.close()
+        super().__init__(path, _Handler)
+        self.path = path
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "reply" and "messages" in request:
+            messages = request["messages"][:MAX_BATCH_MESSAGES]
+            # Answered concurrently so that the SearchBatcher can put them in one batch
+            yield {"replies": list(self.executor.map(chatbot.chat_reply, messages))}
+        elif op == "reply":
+            yield chatbot.chat_reply(request["message"])
+        elif op == "stream":
+            yield from self._stream(request["message"])
+        elif op == "state":
+            yield chatbot.chat_state()
+        elif op == "reload":
+            yield self._reload()
+        else:
+            raise ChatServerError(f"Unknown op {op!r}", 400)
+
+    def _stream(self, message):
+        chat_models = chatbot.chat_models
+        if not chat_models.is_ready():
+            chat_models.start_warmup()
+            done = Done(chat_models.not_ready_response(), "warming_up", chat_models.status)
+            yield {"event": "done", **done.as_dict()}
+            return
+        for event in chatbot.stream_response(message):
+            if isinstance(event, Token):
+                yield {"event": "token", "text": event.text}
+            else:
+                yield {"event": "done", **event.as_dict()}
+
+    def _reload(self):
+        try:
+            return chatbot.chat_models.reload()
+        except RuntimeError as e:
+            raise ChatServerError(str(e), 503)
+        except (OSError, ValueError) as e:
+            logging.error(f"Knowledge base reload error: {str(e)}")
+            raise ChatServerError(f"Knowledge base reload failed: {str(e)}", 400)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def serve(path=SOCKET_PATH):
+    if not path:
+        raise SystemExit("Set CHAT_SERVER_SOCKET to the Unix socket path to listen on")
+    server = ChatServer(path)
+    chatbot.chat_models.start_warmup()
+    chatbot.chat_models.watch()
+    chatbot.answer_generator.start_warmup()
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logging.info(f"Chat server listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+chat_server_client = ChatServerClient(SOCKET_PATH) if SOCKET_PATH else None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
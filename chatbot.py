@@ -0,0 +1,443 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from chat_batcher import SearchBatcher
+from chat_cache import QueryCache, normalize_query
+from chat_generator import Done, answer_generator
+from kb_index import IndexConfig, build_faiss_index, configure_search, update_index
+import kb_store
+from metrics import metrics
+
+# Chatbot configuration
+KNOWLEDGE_BASE_PATH = os.environ.get("CHAT_KNOWLEDGE_BASE", "combined_knowledge_base.json")
+EMBEDDING_MODEL_NAME = os.environ.get("CHAT_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# 'background' starts loading in a thread when the app starts, 'lazy' waits for the
+# first /chat request and 'eager' blocks at startup like the original code did
+WARMUP_MODE = os.environ.get("CHAT_WARMUP", "background")
+DISTANCE_THRESHOLD = float(os.environ.get("CHAT_DISTANCE_THRESHOLD", 2.0))
+TOP_K = int(os.environ.get("CHAT_TOP_K", 3))
+CACHE_MAX_ENTRIES = int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", 2048))
+CACHE_MAX_BYTES = int(os.environ.get("CHAT_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", 3600))
+BATCHING_ENABLED = os.environ.get("CHAT_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("CHAT_BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("CHAT_BATCH_MAX_WAIT_MS", 5))
+# Seconds between checks of the knowledge base file for changes, 0 disables
+KB_WATCH_INTERVAL = float(os.environ.get("CHAT_KB_WATCH_INTERVAL", 10))
+# After a failed warm-up the next /chat retries once this backoff has passed;
+# it doubles with each consecutive failure up to the max
+WARMUP_RETRY_SECONDS = float(os.environ.get("CHAT_WARMUP_RETRY_SECONDS", 30))
+WARMUP_RETRY_MAX_SECONDS = float(os.environ.get("CHAT_WARMUP_RETRY_MAX_SECONDS", 600))
+
+FALLBACK_RESPONSE = "I apologize, but I don't have specific information about that. Please contact our customer service for more detailed assistance."
+WARMING_UP_RESPONSE = "Our assistant is still starting up. Please try again in a few seconds."
+UNAVAILABLE_RESPONSE = "Our assistant is temporarily unavailable. Please try again later or contact our customer service."
+
+
+class KnowledgeBase:
+    # Immutable snapshot of everything the RAG pipeline needs. Readers grab the
+    # current snapshot once per request, so replacing it is a single assignment.
+    # ids[i] is the faiss id of questions[i]; they drift from the row position
+    # once hot reloads start adding and removing questions.
+    def __init__(self, questions, answers, index, embeddings, ids, version=0):
+        self.questions = questions
+        self.answers = answers
+        self.index = index
+        self.embeddings = embeddings
+        self.ids = np.asarray(ids, dtype="int64")
+        self.version = version
+        self._positions = None
+        if not np.array_equal(self.ids, np.arange(len(self.ids))):
+            self._positions = {int(faiss_id): pos for pos, faiss_id in enumerate(self.ids)}
+
+    def position(self, faiss_id):
+        if self._positions is None:
+            return int(faiss_id)
+        return self._positions.get(int(faiss_id), -1)
+
+
+def read_knowledge_base(path):
+    # Returns (questions, answers, content hash). The hash is of the bytes
+    # that were parsed, so the on-disk store is keyed to exactly this content
+    # even if the file changes while it is being encoded.
+    with open(path, "rb") as f:
+        data = f.read()
+    knowledge_data = json.loads(data)
+
+    if not isinstance(knowledge_data, list):
+        raise ValueError("Knowledge base must be a list of question-answer pairs")
+
+    try:
+        questions = [item["question"] for item in knowledge_data]
+        answers = [item["answer"] for item in knowledge_data]
+    except (KeyError, TypeError):
+        raise ValueError("Every knowledge base entry needs a question and an answer")
+    return questions, answers, kb_store.bytes_hash(data)
+
+
+def load_knowledge_base(path=KNOWLEDGE_BASE_PATH):
+    try:
+        questions, answers, kb_hash = read_knowledge_base(path)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+        logging.error(f"Error loading knowledge base: {str(e)}")
+        questions = []
+        answers = []
+        kb_hash = None
+    return questions, answers, kb_hash
+
+
+class ChatModels:
+    COLD = "cold"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, kb_path=KNOWLEDGE_BASE_PATH, model_name=EMBEDDING_MODEL_NAME, index_config=None):
+        self.kb_path = kb_path
+        self.model_name = model_name
+        self.index_config = index_config or IndexConfig.from_env()
+        self.status = self.COLD
+        self.error = None
+        self.failures = 0
+        self._retry_at = 0.0
+        self.timings = {}
+        self.embedder = None
+        self.kb = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._reload_listeners = []
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._kb_mtime = None
+
+    def is_ready(self):
+        return self.status == self.READY
+
+    def start_warmup(self):
+        # Idempotent: only the first caller starts the loader thread. A failed
+        # load is retried by the first caller after the backoff has passed.
+        with self._lock:
+            if self.status == self.FAILED and time.monotonic() >= self._retry_at:
+                logging.info(f"Retrying chat warm-up after {self.failures} failure(s)")
+                self._ready.clear()
+            elif self.status != self.COLD:
+                return
+            self.status = self.LOADING
+            self._thread = threading.Thread(target=self._load, name="chat-warmup", daemon=True)
+            self._thread.start()
+
+    def wait_until_ready(self, timeout=None):
+        self.start_warmup()
+        self._ready.wait(timeout)
+        return self.is_ready()
+
+    def _timed(self, stage, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.timings[stage] = round(time.perf_counter() - started, 4)
+        return result
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            self._kb_mtime = self._current_mtime()
+            questions, answers, kb_hash = self._timed("load_knowledge_base", load_knowledge_base, self.kb_path)
+            self.embedder = self._timed("load_embedder", self._load_embedder)
+            stored = None
+            if kb_hash:
+                stored = self._timed("load_index", kb_store.load, self.kb_path, self.model_name,
+                                     self.index_config.spec(), kb_hash)
+            if stored is not None and stored[1].ntotal == len(questions):
+                embeddings, index, ids = stored
+                configure_search(index, self.index_config)
+            else:
+                embeddings, index = self._timed("build_index", self.build_index, questions)
+                ids = np.arange(len(questions), dtype="int64")
+                if questions:
+                    self._timed("persist_index", self._persist, embeddings, index, ids, kb_hash)
+            self.set_knowledge_base(KnowledgeBase(questions, answers, index, embeddings, ids, version=1))
+            self.error = None
+            self.failures = 0
+            self.status = self.READY
+        except Exception as e:
+            logging.error(f"Chat model loading failed: {str(e)}")
+            self.error = str(e)
+            self.failures += 1
+            backoff = min(WARMUP_RETRY_MAX_SECONDS, WARMUP_RETRY_SECONDS * 2 ** (self.failures - 1))
+            self._retry_at = time.monotonic() + backoff
+            self.status = self.FAILED
+        finally:
+            self.timings["total"] = round(time.perf_counter() - started, 4)
+            logging.info(f"Chat warm-up {self.status} in {self.timings}")
+            self._ready.set()
+
+    def _load_embedder(self):
+        # Imported here so that importing app.py does not pay for torch
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+
+    def encode(self, texts):
+        return np.asarray(self.embedder.encode(texts), dtype="float32")
+
+    def build_index(self, questions):
+        dim = self.embedder.get_sentence_embedding_dimension()
+        if questions:
+            embeddings = self.encode(questions)
+        else:
+            embeddings = np.zeros((0, dim), dtype="float32")
+        return embeddings, build_faiss_index(embeddings, self.index_config)
+
+    def _persist(self, embeddings, index, ids, kb_hash):
+        try:
+            kb_store.save(self.kb_path, self.model_name, embeddings, index, self.index_config.spec(), ids, kb_hash)
+        except (OSError, RuntimeError) as e:
+            # A read-only deploy directory only costs us the re-encode next time
+            logging.error(f"Could not persist knowledge base index: {str(e)}")
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.kb_path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self):
+        # Diffs the knowledge base file against the live snapshot, embeds only
+        # new or reworded questions and swaps in the result in one assignment.
+        # Raises instead of wiping the chatbot when the file is half-written.
+        with self._reload_lock:
+            if not self.is_ready():
+                raise RuntimeError("Chat models are not loaded yet")
+            started = time.perf_counter()
+            mtime = self._current_mtime()
+            old = self.kb
+            questions, answers, kb_hash = read_knowledge_base(self.kb_path)
+
+            unmatched = {}
+            for pos, question in enumerate(old.questions):
+                unmatched.setdefault(question, []).append(pos)
+            old_positions = []
+            for question in questions:
+                slots = unmatched.get(question)
+                old_positions.append(slots.pop(0) if slots else -1)
+            old_positions = np.asarray(old_positions, dtype="int64")
+
+            removed_ids = [old.ids[pos] for slots in unmatched.values() for pos in slots]
+            kept_rows = np.flatnonzero(old_positions >= 0)
+            added_rows = np.flatnonzero(old_positions < 0)
+
+            dim = old.index.d
+            if len(added_rows):
+                added_embeddings = self.encode([questions[row] for row in added_rows])
+            else:
+                added_embeddings = np.zeros((0, dim), dtype="float32")
+            next_id = int(old.ids.max()) + 1 if len(old.ids) else 0
+            added_ids = np.arange(next_id, next_id + len(added_rows), dtype="int64")
+
+            ids = np.empty(len(questions), dtype="int64")
+            embeddings = np.empty((len(questions), dim), dtype="float32")
+            ids[kept_rows] = old.ids[old_positions[kept_rows]]
+            embeddings[kept_rows] = old.embeddings[old_positions[kept_rows]]
+            ids[added_rows] = added_ids
+            embeddings[added_rows] = added_embeddings
+
+            index = update_index(old.index, removed_ids, added_embeddings, added_ids)
+            if index is None:
+                index = build_faiss_index(embeddings, self.index_config, ids)
+            else:
+                configure_search(index, self.index_config)
+
+            changed_answers = sum(
+                1 for row in kept_rows if answers[row] != old.answers[old_positions[row]]
+            )
+            self.set_knowledge_base(KnowledgeBase(questions, answers, index, embeddings, ids, old.version + 1))
+            self._kb_mtime = mtime
+            if questions:
+                self._persist(embeddings, index, ids, kb_hash)
+
+            summary = {
+                "version": self.kb.version,
+                "added": len(added_rows),
+                "removed": len(removed_ids),
+                "changed_answers": changed_answers,
+                "total": len(questions),
+                "seconds": round(time.perf_counter() - started, 4),
+            }
+            logging.info(f"Knowledge base reloaded: {summary}")
+            return summary
+
+    def watch(self, interval=KB_WATCH_INTERVAL):
+        # Polls the knowledge base file's mtime and hot reloads on change
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="chat-kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval):
+        # Keeps polling through failed warm-ups so a later retry is watched too
+        while True:
+            self._ready.wait()
+            time.sleep(interval)
+            if not self.is_ready():
+                continue
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._kb_mtime:
+                continue
+            try:
+                self.reload()
+            except (OSError, ValueError, RuntimeError) as e:
+                # Most likely caught mid-save; the next poll retries
+                logging.error(f"Knowledge base reload failed: {str(e)}")
+
+    def on_reload(self, listener):
+        self._reload_listeners.append(listener)
+
+    def set_knowledge_base(self, kb):
+        self.kb = kb
+        for listener in self._reload_listeners:
+            listener(kb)
+
+    def not_ready_response(self):
+        return UNAVAILABLE_RESPONSE if self.status == self.FAILED else WARMING_UP_RESPONSE
+
+    def state(self):
+        state = {"status": self.status, "error": self.error, "timings": dict(self.timings)}
+        if self.status == self.FAILED:
+            state["failures"] = self.failures
+            state["retry_in_seconds"] = round(max(0.0, self._retry_at - time.monotonic()), 1)
+        return state
+
+
+chat_models = ChatModels()
+response_cache = QueryCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL)
+chat_models.on_reload(lambda kb: response_cache.clear())
+search_batcher = SearchBatcher(chat_models.encode, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS / 1000.0)
+
+
+# RAG pipeline
+def retrieve(user_input, k=TOP_K, max_distance=DISTANCE_THRESHOLD, kb=None):
+    # Top-k matches as dicts ordered by distance, dropping anything at or
+    # beyond max_distance. For the normalized MiniLM embeddings the squared L2
+    # distance maps onto cosine similarity as score = 1 - distance / 2.
+    kb = kb or chat_models.kb
+    if kb is None or kb.index.ntotal == 0:
+        return []
+
+    if BATCHING_ENABLED:
+        distances, indices = search_batcher.search(kb, user_input, k=k)
+    else:
+        with metrics.timer("chat_embed_seconds", mode="single"):
+            user_embedding = chat_models.encode([user_input])
+        with metrics.timer("chat_faiss_search_seconds", mode="single"):
+            distances, indices = kb.index.search(user_embedding, k)
+        distances, indices = distances[0], indices[0]
+
+    matches = []
+    for distance, faiss_id in zip(distances, indices):
+        # faiss pads with -1 when fewer than k vectors are reachable
+        idx = kb.position(faiss_id) if faiss_id >= 0 else -1
+        if idx < 0 or distance >= max_distance:
+            continue
+        matches.append({
+            "question": kb.questions[idx],
+            "answer": kb.answers[idx],
+            "distance": float(distance),
+            "score": 1.0 - float(distance) / 2.0,
+        })
+    return matches
+
+
+def get_contexts(user_input, kb=None, k=1):
+    # Answers of the top k matches, best first
+    with metrics.timer("chat_retrieve_seconds"):
+        matches = retrieve(user_input, k=k, kb=kb)
+    return [match["answer"] for match in matches]
+
+
+def get_context(user_input, kb=None):
+    contexts = get_contexts(user_input, kb)
+    if contexts:
+        return contexts[0]
+    return None
+
+
+def _cache_key(user_input, kb):
+    # Keys carry the knowledge base version so a racing reload can never serve
+    # an answer computed against the previous snapshot, and generated answers
+    # never share a slot with retrieved ones
+    prefix = "gen:" if answer_generator.is_ready() else ""
+    return f"{prefix}{kb.version if kb else 0}:{normalize_query(user_input)}"
+
+
+def _cacheable(done):
+    # Generated answers, and retrieval answers that come out the same every
+    # time: no knowledge base match, or no generator to ask (the key then has
+    # no "gen:" prefix). The fallback for a busy generator, a blown time budget
+    # or a too-short answer would otherwise stand in for the real answer until
+    # the entry expires.
+    return done.source == "generated" or done.reason in ("no_match", "generator_not_ready")
+
+
+def generate_response(user_input):
+    kb = chat_models.kb
+    key = _cache_key(user_input, kb)
+    response = response_cache.get(key)
+    if response is None:
+        done = _generate_uncached(user_input, kb)
+        if _cacheable(done):
+            response_cache.put(key, done.response)
+        response = done.response
+    return response
+
+
+def _generate_uncached(user_input, kb):
+    # The final Done event for user_input, as stream_response would end
+    if answer_generator.is_ready():
+        contexts = get_contexts(user_input, kb, k=answer_generator.contexts)
+        if not contexts:
+            return Done(FALLBACK_RESPONSE, "retrieval", "no_match")
+        return answer_generator.answer(user_input, contexts, contexts[0])
+
+    context = get_context(user_input, kb)
+
+    if context:
+        return Done(f"{context}", "retrieval", "generator_not_ready")
+    return Done(FALLBACK_RESPONSE, "retrieval", "no_match")
+
+
+def chat_reply(user_input):
+    # Body of a /chat JSON response, here and in chat_server.py
+    if not chat_models.is_ready():
+        chat_models.start_warmup()
+        return {"response": chat_models.not_ready_response(), "status": chat_models.status}
+    return {"response": generate_response(user_input)}
+
+
+def chat_state():
+    return {**chat_models.state(), "cache": response_cache.stats(), "batching": search_batcher.stats(),
+            "generation": answer_generator.state()}
+
+
+def stream_response(user_input):
+    # Token events followed by one Done event. Cached answers and questions
+    # without a knowledge base match come back as a single Done.
+    kb = chat_models.kb
+    key = _cache_key(user_input, kb)
+    response = response_cache.get(key)
+    if response is not None:
+        yield Done(response, "cache", "cached")
+        return
+
+    contexts = get_contexts(user_input, kb, k=answer_generator.contexts)
+    if not contexts:
+        yield Done(FALLBACK_RESPONSE, "retrieval", "no_match")
+        return
+    for event in answer_generator.stream(user_input, contexts, contexts[0]):
+        if isinstance(event, Done) and _cacheable(event):
+            response_cache.put(key, event.response)
+        yield event
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from mysql.connector import errors
+
+from metrics import InstrumentedCursor, metrics
+
+# Connection pool for the web app. mysql.connector's own pool has a fixed size
+# and raises PoolError the moment it runs dry; this one opens connections on
+# demand up to max_size, makes callers wait up to `timeout` for one to come
+# back, pings connections that sat idle before handing them out, and retires
+# them after max_uses checkouts, max_idle seconds unused or max_lifetime
+# seconds open. Idle connections are reused most-recent first so the rest can
+# age out.
+
+
+class PoolTimeout(errors.PoolError):
+    pass
+
+
+class _Slot:
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class PooledConnection:
+    # Proxies the real connection; close() hands it back to the pool
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+
+    def __getattr__(self, name):
+        if self._slot is None:
+            raise errors.OperationalError("Connection has been returned to the pool")
+        return getattr(self._slot.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.__getattr__("cursor")(*args, **kwargs), metrics)
+
+    def close(self):
+        if self._slot is None:
+            return
+        slot, self._slot = self._slot, None
+        self._pool._release(slot)
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=2, max_size=10, timeout=5.0, max_uses=1000,
+                 max_idle=300.0, max_lifetime=3600.0, health_check_after=30.0, name="primary"):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes need 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._idle = deque()
+        self._size = 0  # open connections, idle or checked out
+        self._cond = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.exhausted = 0
+        self.created = 0
+        self.recycled = 0
+        self.health_check_failures = 0
+
+        for _ in range(min_size):
+            with self._cond:
+                self._size += 1
+            self._idle.append(self._open())
+
+    def get_connection(self, timeout=None):
+        started = time.monotonic()
+        deadline = started + (self.timeout if timeout is None else timeout)
+        while True:
+            slot = self._checkout(deadline)
+            if slot is None:
+                slot = self._open()
+            elif self._expired(slot, time.monotonic()):
+                self._discard(slot, recycled=True)
+                continue
+            elif not self._healthy(slot):
+                self._discard(slot)
+                continue
+            break
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        metrics.observe("db_pool_wait_seconds", waited, pool=self.name)
+        return PooledConnection(self, slot)
+
+    def _checkout(self, deadline):
+        # An idle slot, or None when the caller may open a new connection
+        stale = []
+        try:
+            with self._cond:
+                stale = self._reap_idle()
+                waited = False
+                while True:
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.exhausted += 1
+                        raise PoolTimeout(f"No {self.name} database connection available in time "
+                                          f"({self.max_size} in use)")
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._cond.wait(remaining)
+        finally:
+            for slot in stale:
+                self._close(slot)
+
+    def _reap_idle(self):
+        # Called with the lock held; the oldest idle slots are on the left
+        stale = []
+        if not self.max_idle:
+            return stale
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.max_idle:
+            stale.append(self._idle.popleft())
+            self._size -= 1
+            self.recycled += 1
+        return stale
+
+    def _open(self):
+        try:
+            slot = _Slot(self._connect())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return slot
+
+    def _expired(self, slot, now):
+        return bool(self.max_lifetime) and now - slot.created_at > self.max_lifetime
+
+    def _healthy(self, slot):
+        if time.monotonic() - slot.last_used < self.health_check_after:
+            return True
+        try:
+            slot.raw.ping(reconnect=False)
+            return True
+        except errors.Error as e:
+            logging.info(f"Discarding dead pooled connection: {str(e)}")
+            with self._cond:
+                self.health_check_failures += 1
+            return False
+
+    def _release(self, slot):
+        slot.uses += 1
+        slot.last_used = time.monotonic()
+        try:
+            # Never hand the next request an open transaction or snapshot
+            if slot.raw.in_transaction:
+                slot.raw.rollback()
+        except errors.Error as e:
+            logging.info(f"Discarding pooled connection after failed rollback: {str(e)}")
+            self._discard(slot)
+            return
+
+        if (self.max_uses and slot.uses >= self.max_uses) or self._expired(slot, slot.last_used):
+            self._discard(slot, recycled=True)
+            return
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    def _discard(self, slot, recycled=False):
+        with self._cond:
+            self._size -= 1
+            if recycled:
+                self.recycled += 1
+            self._cond.notify()
+        self._close(slot)
+
+    def _close(self, slot):
+        try:
+            slot.raw.close()
+        except errors.Error:
+            pass
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "wait_seconds_max": round(self.max_wait_seconds, 6),
+                "exhausted": self.exhausted,
+                "created": self.created,
+                "recycled": self.recycled,
+                "health_check_failures": self.health_check_failures,
+            }
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from mysql.connector import errors
+
+# Read/write splitting between the primary pool and an optional replica pool.
+# Handlers declared read-only are served from the replica unless
+#   - the session wrote within the last sticky_seconds (read-your-writes),
+#   - the replica's reported lag is above max_lag, unknown, or replication
+#     is stopped, or
+#   - no replica connection frees up within checkout_timeout;
+# in each case the read goes to the primary instead. Lag is read with
+# SHOW REPLICA STATUS on a connection that is being handed out anyway, at most
+# once every lag_check_interval seconds. By default a session stays sticky for
+# max_lag + lag_check_interval, the furthest behind a replica we still read
+# from can be.
+PRIMARY = "primary"
+REPLICA = "replica"
+# Primary-only reasons, in the order they are checked
+REASONS = ("write", "no_replica", "sticky", "replica_lag", "replica_unavailable")
+
+
+def replication_lag(conn):
+    # Seconds the replica is behind its source, or None when replication is
+    # stopped or the server is not a replica
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except errors.ProgrammingError:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not rows:
+        return None
+    lag = rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    def __init__(self, primary, replica=None, max_lag=5.0, lag_check_interval=2.0, checkout_timeout=0.5,
+                 sticky_seconds=None):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.checkout_timeout = checkout_timeout
+        self.sticky_seconds = max_lag + lag_check_interval if sticky_seconds is None else sticky_seconds
+        self.lag = None
+        self.lag_checked_at = None
+        self.lag_check_failures = 0
+        self.routed = dict.fromkeys((REPLICA,) + REASONS, 0)
+        self._lag_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def pool(self, name):
+        return self.replica if name == REPLICA and self.replica is not None else self.primary
+
+    def connection(self, read_only=False, last_write=None):
+        # Returns (connection, pool name). last_write is the time.time() of
+        # the session's last write, if any. Primary checkout errors propagate.
+        reason = self._primary_reason(read_only, last_write)
+        if reason is None:
+            try:
+                conn = self.replica.get_connection(timeout=self.checkout_timeout)
+            except errors.Error as e:
+                logging.error(f"Replica unavailable, reading from primary: {str(e)}")
+                reason = "replica_unavailable"
+            else:
+                if self._lag_acceptable(conn):
+                    self._count(REPLICA)
+                    return conn, REPLICA
+                conn.close()
+                reason = "replica_lag"
+        self._count(reason)
+        return self.primary.get_connection(), PRIMARY
+
+    def _primary_reason(self, read_only, last_write):
+        if not read_only:
+            return "write"
+        if self.replica is None:
+            return "no_replica"
+        if last_write is not None and time.time() - last_write < self.sticky_seconds:
+            return "sticky"
+        if self._lag_fresh() and not self._lag_ok():
+            # Known to be behind; don't spend a replica checkout finding out again
+            return "replica_lag"
+        return None
+
+    def _lag_fresh(self):
+        checked_at = self.lag_checked_at
+        return checked_at is not None and time.monotonic() - checked_at < self.lag_check_interval
+
+    def _lag_ok(self):
+        lag = self.lag
+        return lag is not None and lag <= self.max_lag
+
+    def _lag_acceptable(self, conn):
+        # Only one request re-reads the lag when it is due; the rest go by
+        # the last reading
+        if not self._lag_fresh() and self._lag_lock.acquire(blocking=False):
+            try:
+                self.lag = replication_lag(conn)
+            except errors.Error as e:
+                logging.error(f"Replica lag check failed: {str(e)}")
+                self.lag = None
+                self.lag_check_failures += 1
+            finally:
+                self.lag_checked_at = time.monotonic()
+                self._lag_lock.release()
+        return self._lag_ok()
+
+    def _count(self, route):
+        with self._stats_lock:
+            self.routed[route] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            routed = {f"routed_{route}": count for route, count in self.routed.items()}
+        return {
+            "replica_configured": self.replica is not None,
+            "replica_lag_seconds": self.lag,
+            "replica_lag_ok": self._lag_ok(),
+            "max_lag_seconds": self.max_lag,
+            "sticky_seconds": self.sticky_seconds,
+            "lag_check_failures": self.lag_check_failures,
+            **routed,
+        }
@@ -0,0 +1,138 @@
+import logging
+import math
+import os
+
+import numpy as np
+
+# Index backends for the chatbot knowledge base. 'flat' is exact and fine for a
+# few thousand questions; 'ivf' and 'hnsw' trade a little recall for sub-linear
+# search on large knowledge bases. Vectors can be stored as float32, float16 or
+# int8 (scalar quantized) to cut memory.
+BACKENDS = ("flat", "ivf", "hnsw")
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+
+class IndexConfig:
+    def __init__(self, backend="flat", storage="float32", nlist=0, nprobe=8, hnsw_m=32, ef_search=64):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown index backend: {backend}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown index storage: {storage}")
+        self.backend = backend
+        self.storage = storage
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            backend=os.environ.get("CHAT_INDEX_BACKEND", "flat"),
+            storage=os.environ.get("CHAT_INDEX_STORAGE", "float32"),
+            nlist=int(os.environ.get("CHAT_INDEX_NLIST", 0)),
+            nprobe=int(os.environ.get("CHAT_INDEX_NPROBE", 8)),
+            hnsw_m=int(os.environ.get("CHAT_INDEX_HNSW_M", 32)),
+            ef_search=int(os.environ.get("CHAT_INDEX_EF_SEARCH", 64)),
+        )
+
+    def spec(self):
+        # Identifies the on-disk layout; search-time knobs are not part of it
+        if self.backend == "ivf":
+            return f"ivf{self.nlist or 'auto'}-{self.storage}"
+        if self.backend == "hnsw":
+            return f"hnsw{self.hnsw_m}-{self.storage}"
+        return f"flat-{self.storage}"
+
+
+def _scalar_quantizer_type(faiss, storage):
+    if storage == "float16":
+        return faiss.ScalarQuantizer.QT_fp16
+    return faiss.ScalarQuantizer.QT_8bit
+
+
+def _auto_nlist(count):
+    # Rule of thumb from the faiss docs, capped so every list gets ~39 training points
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def build_faiss_index(embeddings, config, ids=None):
+    # Every index is ID-mapped (IVF natively, the others via IndexIDMap2) so a
+    # hot reload can remove and add individual questions. ids default to the
+    # row positions.
+    import faiss
+
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    count, dim = embeddings.shape
+    if ids is None:
+        ids = np.arange(count, dtype="int64")
+    backend = config.backend
+    if backend == "ivf" and count < 39:
+        logging.info(f"Only {count} vectors, using a flat index instead of IVF")
+        backend = "flat"
+
+    if backend == "flat":
+        if config.storage == "float32":
+            index = faiss.IndexFlatL2(dim)
+        else:
+            index = faiss.IndexScalarQuantizer(dim, _scalar_quantizer_type(faiss, config.storage))
+    elif backend == "ivf":
+        nlist = config.nlist or _auto_nlist(count)
+        storage = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}[config.storage]
+        index = faiss.index_factory(dim, f"IVF{nlist},{storage}")
+    else:
+        if config.storage == "float32":
+            index = faiss.IndexHNSWFlat(dim, config.hnsw_m)
+        else:
+            index = faiss.IndexHNSWSQ(dim, _scalar_quantizer_type(faiss, config.storage), config.hnsw_m)
+
+    if not index.is_trained and count:
+        index.train(embeddings)
+    if backend != "ivf":
+        index = faiss.IndexIDMap2(index)
+    if count:
+        index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    configure_search(index, config)
+    return index
+
+
+def is_id_mapped(index):
+    import faiss
+
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or faiss.try_extract_index_ivf(index) is not None
+
+
+def update_index(index, remove_ids, add_embeddings, add_ids):
+    # Applies a diff to a copy of the index so searches running against the
+    # original are never disturbed. Returns None when the backend cannot remove
+    # vectors in place (HNSW), in which case the caller rebuilds.
+    import faiss
+
+    if not is_id_mapped(index):
+        return None
+    try:
+        updated = faiss.clone_index(index)
+        if len(remove_ids):
+            updated.remove_ids(np.asarray(remove_ids, dtype="int64"))
+        if len(add_ids):
+            updated.add_with_ids(np.ascontiguousarray(add_embeddings, dtype="float32"), np.asarray(add_ids, dtype="int64"))
+        return updated
+    except RuntimeError as e:
+        logging.info(f"Index does not support in-place updates, rebuilding: {str(e)}")
+        return None
+
+
+def configure_search(index, config):
+    # nprobe / efSearch are not serialized, so they are applied after every load
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.nprobe
+    inner = index
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(index.index)
+    hnsw = getattr(inner, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = config.ef_search
+    return index
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+# On-disk cache of the knowledge base embeddings and FAISS index. The files sit
+# next to the JSON file and are only trusted when the recorded content hash and
+# embedding model match, so editing the JSON or switching models re-encodes.
+#
+#   python kb_store.py [combined_knowledge_base.json]
+
+
+def store_paths(kb_path):
+    base, _ = os.path.splitext(kb_path)
+    return {
+        "embeddings": base + ".embeddings.npy",
+        "ids": base + ".ids.npy",
+        "index": base + ".faiss",
+        "meta": base + ".meta.json",
+    }
+
+
+def content_hash(kb_path):
+    digest = hashlib.sha256()
+    with open(kb_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_hash(data):
+    # Same digest as content_hash, for knowledge base bytes already in memory
+    return hashlib.sha256(data).hexdigest()
+
+
+def _atomic_write(path, write):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save(kb_path, model_name, embeddings, index, index_spec="flat-float32", ids=None, kb_hash=None):
+    # kb_hash is the hash of the bytes the embeddings were computed from. Pass
+    # it whenever the file may have changed since it was parsed; otherwise the
+    # store would vouch for the new content with the old vectors.
+    import faiss
+
+    paths = store_paths(kb_path)
+    meta = {
+        "content_hash": kb_hash or content_hash(kb_path),
+        "model": model_name,
+        "index_spec": index_spec,
+        "count": int(embeddings.shape[0]),
+        "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+    }
+
+    def write_embeddings(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+
+    def write_ids(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, ids if ids is not None else np.arange(embeddings.shape[0], dtype="int64"))
+
+    def write_meta(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+
+    # Meta goes last: a crash part-way leaves a stale hash and forces a rebuild
+    _atomic_write(paths["embeddings"], write_embeddings)
+    _atomic_write(paths["ids"], write_ids)
+    _atomic_write(paths["index"], lambda tmp_path: faiss.write_index(index, tmp_path))
+    _atomic_write(paths["meta"], write_meta)
+
+
+def load(kb_path, model_name, index_spec="flat-float32", kb_hash=None):
+    # Returns (embeddings, index, ids) memory-mapped from disk, or None when the
+    # store is missing or was built from different content, another model or
+    # another index layout. kb_hash, when given, is the hash of the content
+    # the caller parsed, checked instead of re-reading the file.
+    import faiss
+
+    paths = store_paths(kb_path)
+    try:
+        with open(paths["meta"], "r") as f:
+            meta = json.load(f)
+        if meta.get("model") != model_name or meta.get("index_spec", "flat-float32") != index_spec:
+            return None
+        if meta.get("content_hash") != (kb_hash or content_hash(kb_path)):
+            return None
+
+        embeddings = np.load(paths["embeddings"], mmap_mode="r")
+        ids = np.load(paths["ids"], mmap_mode="r")
+        try:
+            index = faiss.read_index(paths["index"], faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be memory-mapped by faiss
+            index = faiss.read_index(paths["index"])
+
+        if index.ntotal != meta["count"] or embeddings.shape[0] != meta["count"] or ids.shape[0] != meta["count"]:
+            return None
+        return embeddings, index, ids
+    except (FileNotFoundError, ValueError, KeyError, RuntimeError, OSError) as e:
+        logging.info(f"Knowledge base store not usable, re-encoding: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+
+    from chatbot import ChatModels, KNOWLEDGE_BASE_PATH
+
+    models = ChatModels(sys.argv[1] if len(sys.argv) > 1 else KNOWLEDGE_BASE_PATH)
+    if not models.wait_until_ready():
+        sys.exit(f"Build failed: {models.error}")
+    print(json.dumps({"paths": store_paths(models.kb_path), "timings": models.timings}, indent=2))
@@ -0,0 +1,47 @@
+from pagination import Keyset
+
+# Query shapes of the paginated listings and /admin/search. They live apart
+# from app.py so migrate.py --check-explain can build the exact statements
+# the app sends without importing it.
+
+# Stable orderings for the paginated listings
+CUSTOMER_KEYSET = Keyset([("customer_id", "customer_id")])
+CAR_KEYSET = Keyset([("car_id", "car_id")])
+CAR_KEYSET_NEWEST = Keyset([("car_id", "car_id")], descending=True)
+RENTAL_KEYSET_NEWEST = Keyset([("r.rental_id", "rental_id")], descending=True)
+RENTAL_HISTORY_KEYSET = Keyset([("r.start_date", "start_date"), ("r.rental_id", "rental_id")], descending=True)
+
+CUSTOMERS_SQL = "SELECT * FROM Customers"
+CARS_SQL = "SELECT * FROM Cars"
+RENTAL_DETAILS_SQL = """
+    SELECT r.*, c.first_name, c.last_name, cars.model
+    FROM Rentals r
+    JOIN Customers c ON r.customer_id = c.customer_id
+    JOIN Cars cars ON r.car_id = cars.car_id
+"""
+
+# /admin/search without the index, or when paging / streaming every match:
+# type -> (select_sql, keyset, where), every %s taking the same %term%
+SEARCH_FILTERS = {
+    "customers": (CUSTOMERS_SQL, CUSTOMER_KEYSET, "first_name LIKE %s OR last_name LIKE %s OR email LIKE %s"),
+    "cars": (CARS_SQL, CAR_KEYSET, "model LIKE %s OR status LIKE %s"),
+    "rentals": (RENTAL_DETAILS_SQL, RENTAL_KEYSET_NEWEST,
+                "c.first_name LIKE %s OR c.last_name LIKE %s OR cars.model LIKE %s"),
+}
+
+# Ranked search fetches the index hits by primary key
+CUSTOMERS_BY_ID_SQL = "SELECT * FROM Customers WHERE customer_id IN ({})"
+CARS_BY_ID_SQL = "SELECT * FROM Cars WHERE car_id IN ({})"
+
+
+def rentals_by_party_query(customer_ids, car_ids, limit):
+    # Newest rentals of the matched customers or cars; at least one of the id
+    # lists must be non-empty
+    conditions = []
+    params = []
+    for column, ids in (("r.customer_id", customer_ids), ("r.car_id", car_ids)):
+        if ids:
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(ids))})")
+            params.extend(ids)
+    sql = RENTAL_DETAILS_SQL + " WHERE " + " OR ".join(conditions) + " ORDER BY r.rental_id DESC LIMIT %s"
+    return sql, params + [limit]
@@ -0,0 +1,274 @@
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# In-process metrics rendered in the Prometheus text format by /metrics.
+# Histograms and counters are keyed by label values; gauge sources are
+# callables (pool stats, cache stats) read at scrape time. Every request also
+# accumulates its SQL and template time in a thread-local so slow requests can
+# be logged with a breakdown.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Log requests slower than this many seconds; 0 turns the slow log off
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+# Statements with a new fingerprint beyond this many are counted as "other"
+MAX_STATEMENTS = 500
+MAX_FINGERPRINT_LENGTH = 200
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+
+def fingerprint(sql):
+    # Collapses literals, placeholders and IN / VALUES lists so every call
+    # site maps onto one series however many values it was given
+    sql = _WHITESPACE.sub(" ", str(sql)).strip()
+    sql = _LITERALS.sub("?", sql.replace("%s", "?"))
+    sql = _REPEATED_LISTS.sub("(...)", _VALUE_LIST.sub("(...)", sql))
+    return sql[:MAX_FINGERPRINT_LENGTH]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Family:
+    def __init__(self, name, kind, help_text, labels, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+
+class Metrics:
+    def __init__(self):
+        self._families = {}
+        self._gauges = []
+        self._statements = set()
+        self._lock = threading.Lock()
+        self._request = threading.local()
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self._families[name] = _Family(name, "histogram", help_text, tuple(labels), tuple(buckets))
+
+    def counter(self, name, help_text, labels=()):
+        self._families[name] = _Family(name, "counter", help_text, tuple(labels))
+
+    def gauges(self, prefix, source, help_text, **labels):
+        # source() returns a dict; each numeric value becomes <prefix>_<key>
+        self._gauges.append((prefix, source, help_text, labels))
+
+    def observe(self, name, value, **labels):
+        family = self._families[name]
+        key = tuple(labels.get(label, "") for label in family.labels)
+        with self._lock:
+            series = family.series.get(key)
+            if series is None:
+                series = family.series[key] = [[0] * (len(family.buckets) + 1), 0.0]
+            series[0][bisect_left(family.buckets, value)] += 1
+            series[1] += value
+
+    def inc(self, name, amount=1, **labels):
+        family = self._families[name]
+        key = tuple(labels.get(label, "") for label in family.labels)
+        with self._lock:
+            family.series[key] = family.series.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def statement_label(self, sql):
+        label = fingerprint(sql)
+        with self._lock:
+            if label in self._statements:
+                return label
+            if len(self._statements) >= MAX_STATEMENTS:
+                return "other"
+            self._statements.add(label)
+        return label
+
+    # Per-request accounting, driven by the app's before / teardown request
+    # hooks, or for a streamed response by its close hook
+    def begin_request(self):
+        self._request.started = time.perf_counter()
+        self._request.sql_seconds = 0.0
+        self._request.sql_statements = 0
+        self._request.slowest_sql = (0.0, None)
+        self._request.template_seconds = 0.0
+
+    def request_started(self):
+        return getattr(self._request, "started", None)
+
+    def end_request(self, route, method, status, path, request_started=None):
+        # request_started, from request_started(), makes a late call for a
+        # request this thread has moved on from a no-op
+        started = getattr(self._request, "started", None)
+        if started is None or (request_started is not None and started != request_started):
+            return
+        self._request.started = None
+        elapsed = time.perf_counter() - started
+        self.observe("http_request_duration_seconds", elapsed, route=route, method=method, status=status)
+        if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+            slowest_seconds, slowest = self._request.slowest_sql
+            logging.warning(
+                f"Slow request {method} {path} -> {status} in {elapsed:.3f}s: "
+                f"{self._request.sql_statements} SQL statements in {self._request.sql_seconds:.3f}s, "
+                f"templates {self._request.template_seconds:.3f}s"
+                + (f", slowest SQL {slowest_seconds:.3f}s: {slowest}" if slowest else ""))
+
+    def record_sql(self, statement, seconds):
+        self.observe("sql_statement_duration_seconds", seconds, statement=statement)
+        if getattr(self._request, "started", None) is not None:
+            self._request.sql_seconds += seconds
+            self._request.sql_statements += 1
+            if seconds > self._request.slowest_sql[0]:
+                self._request.slowest_sql = (seconds, statement)
+
+    def record_fetch(self, statement, seconds, rows):
+        self.inc("sql_rows_returned_total", rows, statement=statement)
+        self.inc("sql_fetch_seconds_total", seconds, statement=statement)
+        if getattr(self._request, "started", None) is not None:
+            self._request.sql_seconds += seconds
+
+    def template_started(self):
+        self._request.template_started = time.perf_counter()
+
+    def template_finished(self, template):
+        started = getattr(self._request, "template_started", None)
+        if started is None:
+            return
+        self._request.template_started = None
+        elapsed = time.perf_counter() - started
+        self.observe("template_render_duration_seconds", elapsed, template=template)
+        if getattr(self._request, "started", None) is not None:
+            self._request.template_seconds += elapsed
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for family in self._families.values():
+                lines.append(f"# HELP {family.name} {family.help_text}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                for key, series in sorted(family.series.items()):
+                    if family.kind == "counter":
+                        lines.append(f"{family.name}{_label_text(family.labels, key)} {series}")
+                        continue
+                    counts, total = series
+                    cumulative = 0
+                    for bound, count in zip(family.buckets + ("+Inf",), counts):
+                        cumulative += count
+                        le = f'le="{bound}"'
+                        lines.append(f"{family.name}_bucket{_label_text(family.labels, key, le)} {cumulative}")
+                    lines.append(f"{family.name}_sum{_label_text(family.labels, key)} {total}")
+                    lines.append(f"{family.name}_count{_label_text(family.labels, key)} {cumulative}")
+
+        # Sources sharing a prefix (one per pool, say) differ only in their
+        # labels; their samples go under a single HELP / TYPE per gauge name
+        gauges = {}
+        for prefix, source, help_text, labels in self._gauges:
+            try:
+                values = source()
+            except Exception as e:
+                logging.error(f"Metrics source {prefix} failed: {str(e)}")
+                continue
+            names, label_values = tuple(labels), tuple(labels.values())
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                if name not in gauges:
+                    gauges[name] = [f"# HELP {name} {help_text} ({key})", f"# TYPE {name} gauge"]
+                gauges[name].append(f"{name}{_label_text(names, label_values)} {value}")
+        for samples in gauges.values():
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedCursor:
+    # Wraps a DB-API cursor: execute() time per statement fingerprint, and
+    # fetch time and row counts charged to the statement that produced them
+    def __init__(self, cursor, registry):
+        self._cursor = cursor
+        self._metrics = registry
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        row = self.fetchone()
+        while row is not None:
+            yield row
+            row = self.fetchone()
+
+    def _execute(self, method, operation, *args, **kwargs):
+        self._statement = self._metrics.statement_label(operation)
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            self._metrics.record_sql(self._statement, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._execute(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._execute(self._cursor.executemany, operation, *args, **kwargs)
+
+    def _fetched(self, started, rows):
+        if self._statement is not None:
+            self._metrics.record_fetch(self._statement, time.perf_counter() - started, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+metrics = Metrics()
+metrics.histogram("http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+metrics.histogram("sql_statement_duration_seconds", "SQL execute time by statement fingerprint", ("statement",))
+metrics.counter("sql_fetch_seconds_total", "Time spent fetching result rows", ("statement",))
+metrics.counter("sql_rows_returned_total", "Rows fetched", ("statement",))
+metrics.histogram("template_render_duration_seconds", "Template render time", ("template",))
+metrics.histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ("pool",))
+metrics.histogram("chat_embed_seconds", "Query embedding time", ("mode",))
+metrics.histogram("chat_faiss_search_seconds", "FAISS search time", ("mode",))
+metrics.histogram("chat_retrieve_seconds", "End-to-end retrieval time in get_context")
+metrics.histogram("chat_generation_first_token_seconds", "Time to the first generated token")
+metrics.histogram("chat_generation_seconds", "Total answer generation time")
+metrics.counter("chat_generation_total", "Generation attempts by outcome", ("outcome",))
+metrics.counter("booking_lock_retries_total", "Booking transactions retried after a lock error", ("errno",))
+metrics.counter("booking_claims_missed_total", "Optimistic car claims that matched no row")
@@ -0,0 +1,263 @@
+import argparse
+import ast
+import glob
+import inspect
+import logging
+import os
+import re
+import sys
+from datetime import date
+
+import mysql.connector
+
+from settings import DB_SETTINGS
+
+# Versioned schema migrations. Files in migrations/ are named NNNN_name.sql
+# and applied in order; applied versions are recorded in schema_migrations.
+#
+#   python migrate.py                  apply pending migrations
+#   python migrate.py --status         list applied and pending migrations
+#   python migrate.py --check-explain  EXPLAIN every query in the app and fail
+#                                      if one scans Rentals, Cars or Customers
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "migrations")
+
+# Modules whose cursor.execute() statements are checked
+QUERY_MODULES = ["app.py", "availability.py", "batch_booking.py", "booking.py", "overdue.py", "rental_export.py",
+                 "rental_stats.py", "search_index.py"]
+
+# Tables that must never be read with a full scan (EXPLAIN type ALL)
+SCAN_CHECKED_TABLES = {"rentals", "cars", "customers"}
+
+# Statements that read whole tables on purpose (reconciliation, unfiltered
+# admin listings, the fleet for date-range availability), compared with
+# whitespace-normalized SQL
+FULL_SCAN_ALLOWED = {
+    "SELECT c.car_id, c.model, COUNT(r.rental_id) as rental_count FROM Cars c "
+    "LEFT JOIN Rentals r ON c.car_id = r.car_id GROUP BY c.car_id, c.model",
+    "SELECT customer_id, first_name, last_name, email, phone, address FROM Customers ORDER BY customer_id DESC",
+    "SELECT * FROM Cars WHERE status != 'Under Maintenance' ORDER BY price_per_day",
+}
+
+
+def migration_files():
+    files = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        version = os.path.basename(path).split("_", 1)[0]
+        files.append((version, path))
+    return files
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        done = applied_versions(cursor)
+        for version, path in migration_files():
+            if version in done:
+                continue
+            with open(path, "r") as f:
+                statements = split_statements(f.read())
+            # MySQL commits DDL implicitly, so a failing file is not rolled
+            # back; it is simply not recorded and can be fixed and re-run
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                           (version, os.path.basename(path)))
+            conn.commit()
+            print(f"applied {os.path.basename(path)}")
+    finally:
+        cursor.close()
+
+
+def status(conn):
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    for version, path in migration_files():
+        print(f"{'applied' if version in done else 'pending'}  {os.path.basename(path)}")
+
+
+def normalize_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _literal_sql(arg):
+    # The SQL of an execute() argument that is a string literal or an f-string
+    # whose only substitutions are IN-list placeholders (each checked as a
+    # single %s); None for anything built at run time
+    if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+        return arg.value
+    if isinstance(arg, ast.JoinedStr):
+        return "".join(part.value if isinstance(part, ast.Constant) else "%s" for part in arg.values)
+    return None
+
+
+def app_queries():
+    # (module, line, sql, params) for every statement passed to
+    # cursor.execute(); params is None where sample_params() fills them in
+    queries = []
+    for module in QUERY_MODULES:
+        path = os.path.join(BASE_DIR, module)
+        with open(path, "r") as f:
+            tree = ast.parse(f.read(), filename=module)
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr == "execute" and node.args):
+                continue
+            sql = _literal_sql(node.args[0])
+            if sql is not None:
+                sql = normalize_sql(sql)
+                touches_table = re.match(r"(UPDATE|DELETE)\b", sql, re.IGNORECASE) or \
+                    (re.match(r"SELECT\b", sql, re.IGNORECASE) and re.search(r"\bFROM\b", sql, re.IGNORECASE))
+                if touches_table:
+                    queries.append((module, node.lineno, sql, None))
+    return queries + built_queries()
+
+
+def built_queries():
+    # Statements assembled at run time, with the kind of arguments the app
+    # sends: first and later keyset pages, a search term, index hits. The
+    # unfiltered rental export reads everything on purpose and is skipped.
+    import listings
+    from pagination import DEFAULT_PAGE_SIZE, build_query
+    from rental_export import ExportRequest
+
+    queries = []
+
+    def add(where, sql, params):
+        queries.append(("listings.py", where, normalize_sql(sql), list(params)))
+
+    limit = DEFAULT_PAGE_SIZE + 1
+    pages = [
+        ("RENTAL_HISTORY_KEYSET", listings.RENTAL_DETAILS_SQL, listings.RENTAL_HISTORY_KEYSET,
+         [date(2025, 6, 1), 5000]),
+        ("CUSTOMER_KEYSET", listings.CUSTOMERS_SQL, listings.CUSTOMER_KEYSET, [5000]),
+        ("CAR_KEYSET_NEWEST", listings.CARS_SQL, listings.CAR_KEYSET_NEWEST, [500]),
+    ]
+    for name, select_sql, keyset, after in pages:
+        for page_after in (None, after):
+            add(name, *build_query(select_sql, keyset, after=page_after, limit=limit))
+
+    for search_type, (select_sql, keyset, where) in listings.SEARCH_FILTERS.items():
+        add(f"SEARCH_FILTERS[{search_type}]",
+            *build_query(select_sql, keyset, where, ["%smith%"] * where.count("%s"), limit=limit))
+
+    ids = [101, 202, 303]
+    add("CUSTOMERS_BY_ID_SQL", listings.CUSTOMERS_BY_ID_SQL.format(", ".join(["%s"] * len(ids))), ids)
+    add("CARS_BY_ID_SQL", listings.CARS_BY_ID_SQL.format(", ".join(["%s"] * len(ids))), ids)
+    add("rentals_by_party_query", *listings.rentals_by_party_query(ids, ids[:2], DEFAULT_PAGE_SIZE))
+
+    export = ExportRequest(since=date(2025, 1, 1), until=date(2025, 12, 31), statuses=["Completed"])
+    sql, params = export.query()
+    queries.append(("rental_export.py", inspect.getsourcelines(ExportRequest.query)[1], normalize_sql(sql),
+                    list(params)))
+    return queries
+
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)"
+                        r"(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|LEFT|INNER|ON|SET|ORDER|GROUP|LIMIT|FOR)\b)(\w+))?",
+                        re.IGNORECASE)
+
+
+def table_aliases(sql):
+    # What EXPLAIN's table column can show (alias or bare name) -> table name
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def sample_params(sql):
+    # Plausible values for each %s so EXPLAIN sees the right types: a string
+    # compared to an integer column still uses the index, the reverse does not
+    params = []
+    for match in re.finditer(r"(\w+)?\s*(?:=|<|>|<=|>=|LIKE)?\s*%s", sql):
+        preceding = sql[:match.start() + len(match.group(0))]
+        column = (match.group(1) or "").lower()
+        if re.search(r"LIMIT\s+%s$", preceding, re.IGNORECASE):
+            params.append(10)
+        elif "date" in column:
+            params.append("2025-01-01")
+        elif re.search(r"LIKE\s+%s$", preceding, re.IGNORECASE):
+            params.append("%sample%")
+        else:
+            params.append("1")
+    return params
+
+
+def check_explain(conn):
+    # A statement regresses when it reads Rentals, Cars or Customers with type
+    # ALL, whether or not MySQL had a candidate index: one it chose not to use
+    # is as much a full scan. Run it against a database of realistic size.
+    cursor = conn.cursor(dictionary=True)
+    failures = []
+    checked = 0
+    try:
+        for module, line, sql, params in app_queries():
+            if sql in FULL_SCAN_ALLOWED:
+                continue
+            cursor.execute("EXPLAIN " + sql, sample_params(sql) if params is None else params)
+            plan = cursor.fetchall()
+            checked += 1
+            aliases = table_aliases(sql)
+            for step in plan:
+                table = aliases.get(str(step.get("table")).lower())
+                if step.get("type") == "ALL" and table in SCAN_CHECKED_TABLES:
+                    failures.append(f"{module}:{line} full scan of {step.get('table')}: {sql}")
+    finally:
+        cursor.close()
+
+    for failure in failures:
+        print(failure)
+    print(f"{checked} queries checked, {len(failures)} full scans")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply car_rental schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-explain", action="store_true", help="fail if an app query needs a full table scan")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    conn = mysql.connector.connect(**DB_SETTINGS)
+    try:
+        if args.status:
+            status(conn)
+        elif args.check_explain:
+            if not check_explain(conn):
+                sys.exit(1)
+        else:
+            migrate(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+-- Tables as created by the original car_rental.sql script, with the duplicate
+-- password column and the separate registration_number ALTER folded in.
+CREATE TABLE IF NOT EXISTS Customers (
+    customer_id INT PRIMARY KEY AUTO_INCREMENT,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    email VARCHAR(100),
+    password VARCHAR(255) NOT NULL,
+    phone VARCHAR(15),
+    address VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS Admins (
+    admin_id INT PRIMARY KEY AUTO_INCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Cars (
+    car_id INT PRIMARY KEY AUTO_INCREMENT,
+    model VARCHAR(50),
+    make VARCHAR(50),
+    year INT,
+    registration_number VARCHAR(20) UNIQUE,
+    status ENUM('Available', 'Rented', 'Under Maintenance') DEFAULT 'Available',
+    price_per_day DECIMAL(10, 2)
+);
+
+CREATE TABLE IF NOT EXISTS Rentals (
+    rental_id INT PRIMARY KEY AUTO_INCREMENT,
+    customer_id INT,
+    car_id INT,
+    start_date DATE,
+    end_date DATE,
+    total_cost DECIMAL(10, 2),
+    status ENUM('Ongoing', 'Completed', 'Cancelled') DEFAULT 'Ongoing',
+    FOREIGN KEY (customer_id) REFERENCES Customers(customer_id) ON DELETE CASCADE,
+    FOREIGN KEY (car_id) REFERENCES Cars(car_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Payments (
+    payment_id INT PRIMARY KEY AUTO_INCREMENT,
+    rental_id INT,
+    amount DECIMAL(10, 2),
+    payment_date DATE,
+    payment_method VARCHAR(50),
+    FOREIGN KEY (rental_id) REFERENCES Rentals(rental_id) ON DELETE CASCADE
+);
@@ -0,0 +1,12 @@
+-- Admin accounts and sample data from the original car_rental.sql
+INSERT IGNORE INTO Admins (username, password)
+VALUES ('Admin1', SHA2('admin@12', 256));
+
+INSERT IGNORE INTO Admins (username, password)
+VALUES ('Admin2', SHA2('admin@12', 256));
+
+INSERT IGNORE INTO Cars (model, make, year, registration_number, status, price_per_day)
+VALUES ('Civic', 'Honda', 2023, 'ABC123', 'Available', 50.00);
+
+INSERT IGNORE INTO Cars (model, make, year, registration_number, status, price_per_day)
+VALUES ('Corolla', 'Toyota', 2022, 'DEF456', 'Available', 45.00);
@@ -0,0 +1,20 @@
+-- Indexes for the lookups app.py runs on every request.
+-- Fails if Customers already holds duplicate emails; merge those first.
+
+-- login and register look customers up by email
+ALTER TABLE Customers ADD UNIQUE INDEX uq_customers_email (email);
+
+-- active rentals, statistics and the availability engine filter on status
+ALTER TABLE Rentals ADD INDEX idx_rentals_status_start (status, start_date);
+
+-- per-car overlap checks when booking
+ALTER TABLE Rentals ADD INDEX idx_rentals_car_start (car_id, start_date);
+
+-- a customer's rental history on the profile page
+ALTER TABLE Rentals ADD INDEX idx_rentals_customer_start (customer_id, start_date);
+
+-- rental history pages ordered by start_date
+ALTER TABLE Rentals ADD INDEX idx_rentals_start (start_date);
+
+-- the public catalogue: available cars by price
+ALTER TABLE Cars ADD INDEX idx_cars_status_price (status, price_per_day);
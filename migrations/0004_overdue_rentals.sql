@@ -0,0 +1,6 @@
+-- Overdue handling (overdue.py). overdue_since is set when the scheduler
+-- flags an ongoing rental whose end_date has passed instead of completing it.
+ALTER TABLE Rentals ADD COLUMN overdue_since DATE NULL;
+
+-- the overdue sweep: ongoing rentals by end_date
+ALTER TABLE Rentals ADD INDEX idx_rentals_status_end (status, end_date);
@@ -0,0 +1,255 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from availability import availability_index
+from catalogue_cache import catalogue_cache
+from rental_stats import rental_stats
+
+# Sweeps 'Ongoing' rentals whose end_date has passed. In 'complete' mode they
+# are completed and their cars released; in 'flag' mode they stay ongoing and
+# get overdue_since set. Work is done in set-based UPDATEs of at most
+# BATCH_SIZE rentals, each batch in its own short transaction, so row locks
+# are never held for long. Every sweep, in either mode, first marks the cars
+# of reservations whose start_date has arrived as Rented. The scheduler runs in every worker, but a MySQL
+# named lock lets only one of them sweep at a time.
+INTERVAL_SECONDS = float(os.environ.get("OVERDUE_INTERVAL_SECONDS", 300))  # 0 disables
+ACTION = os.environ.get("OVERDUE_ACTION", "complete")
+BATCH_SIZE = int(os.environ.get("OVERDUE_BATCH_SIZE", 200))
+GRACE_DAYS = int(os.environ.get("OVERDUE_GRACE_DAYS", 0))
+ACTIONS = ("complete", "flag")
+LOCK_NAME = "car_rental_overdue_sweep"
+
+
+def overdue_cutoff(as_of=None, grace_days=GRACE_DAYS):
+    # Rentals with end_date before this are overdue
+    return (as_of or date.today()) - timedelta(days=grace_days)
+
+
+def _in_list(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def start_due_reservations(cursor):
+    # Takes the cars of future reservations off the lot once their start_date
+    # arrives (rentals starting today already did so when booked). Returns
+    # the number of cars marked Rented.
+    cursor.execute("START TRANSACTION")
+    cursor.execute("""
+        UPDATE Cars SET status = 'Rented'
+        WHERE status = 'Available' AND car_id IN (
+            SELECT car_id FROM Rentals
+            WHERE status = 'Ongoing' AND start_date <= CURDATE() AND end_date >= CURDATE()
+        )
+    """)
+    taken = cursor.rowcount
+    cursor.execute("COMMIT")
+    if taken > 0:
+        catalogue_cache.invalidate()
+        rental_stats.cars_taken(taken)
+    return taken
+
+
+def release_cars(cursor, car_ids):
+    # Puts cars that are out back on the lot unless another started rental
+    # still holds them. Run after the rentals ending are no longer 'Ongoing';
+    # returns the number of cars released.
+    car_ids = sorted(set(car_ids))
+    cursor.execute(f"""
+        UPDATE Cars SET status = 'Available'
+        WHERE car_id IN ({_in_list(car_ids)}) AND status = 'Rented'
+        AND car_id NOT IN (
+            SELECT car_id FROM Rentals
+            WHERE car_id IN ({_in_list(car_ids)}) AND status = 'Ongoing' AND start_date <= CURDATE()
+        )
+    """, car_ids + car_ids)
+    return cursor.rowcount
+
+
+def _complete_locked(cursor, rentals):
+    # Completes `rentals` (already locked FOR UPDATE) and releases their cars.
+    # Returns the number of cars released.
+    rental_ids = [rental['rental_id'] for rental in rentals]
+    cursor.execute(f"UPDATE Rentals SET status = 'Completed' WHERE rental_id IN ({_in_list(rental_ids)})",
+                   rental_ids)
+    return release_cars(cursor, [rental['car_id'] for rental in rentals])
+
+
+def _after_commit(rentals, cars_released):
+    for rental in rentals:
+        availability_index.remove(rental['rental_id'])
+    catalogue_cache.invalidate()
+    rental_stats.rentals_completed([(rental['total_cost'], rental['end_date']) for rental in rentals],
+                                   cars_released)
+
+
+class SweepResult:
+    def __init__(self, action):
+        self.action = action
+        self.rentals = 0
+        self.cars_released = 0
+        self.cars_taken = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+
+    def as_dict(self):
+        return {
+            "action": self.action,
+            "rentals": self.rentals,
+            "cars_released": self.cars_released,
+            "cars_taken": self.cars_taken,
+            "batches": self.batches,
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+def complete_overdue(cursor, cutoff, batch_size=BATCH_SIZE):
+    result = SweepResult("complete")
+    while True:
+        cursor.execute("START TRANSACTION")
+        cursor.execute("""
+            SELECT rental_id, car_id, end_date, total_cost FROM Rentals
+            WHERE status = 'Ongoing' AND end_date < %s
+            ORDER BY end_date, rental_id
+            LIMIT %s
+            FOR UPDATE
+        """, (cutoff, batch_size))
+        rentals = cursor.fetchall()
+        if not rentals:
+            cursor.execute("ROLLBACK")
+            break
+        released = _complete_locked(cursor, rentals)
+        cursor.execute("COMMIT")
+        _after_commit(rentals, released)
+        result.rentals += len(rentals)
+        result.cars_released += released
+        result.batches += 1
+        if len(rentals) < batch_size:
+            break
+    return result
+
+
+def complete_rentals(cursor, rental_ids, batch_size=BATCH_SIZE):
+    # Bulk form of PUT /complete_rental; ids that are not ongoing are skipped
+    result = SweepResult("complete")
+    rental_ids = sorted(set(rental_ids))
+    for i in range(0, len(rental_ids), batch_size):
+        chunk = rental_ids[i:i + batch_size]
+        cursor.execute("START TRANSACTION")
+        cursor.execute(f"""
+            SELECT rental_id, car_id, end_date, total_cost FROM Rentals
+            WHERE rental_id IN ({_in_list(chunk)}) AND status = 'Ongoing'
+            FOR UPDATE
+        """, chunk)
+        rentals = cursor.fetchall()
+        if not rentals:
+            cursor.execute("ROLLBACK")
+            continue
+        released = _complete_locked(cursor, rentals)
+        cursor.execute("COMMIT")
+        _after_commit(rentals, released)
+        result.rentals += len(rentals)
+        result.cars_released += released
+        result.batches += 1
+    return result
+
+
+def flag_overdue(cursor, cutoff, batch_size=BATCH_SIZE):
+    result = SweepResult("flag")
+    while True:
+        cursor.execute("""
+            UPDATE Rentals SET overdue_since = CURDATE()
+            WHERE status = 'Ongoing' AND end_date < %s AND overdue_since IS NULL
+            LIMIT %s
+        """, (cutoff, batch_size))
+        flagged = cursor.rowcount
+        cursor.execute("COMMIT")
+        if flagged <= 0:
+            break
+        result.rentals += flagged
+        result.batches += 1
+        if flagged < batch_size:
+            break
+    return result
+
+
+class OverdueScheduler:
+    def __init__(self, interval=INTERVAL_SECONDS, action=ACTION, batch_size=BATCH_SIZE, grace_days=GRACE_DAYS):
+        if action not in ACTIONS:
+            raise ValueError(f"OVERDUE_ACTION must be one of {', '.join(ACTIONS)}")
+        self.interval = interval
+        self.action = action
+        self.batch_size = batch_size
+        self.grace_days = grace_days
+        self.runs = 0
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self._thread = None
+
+    def start(self, get_connection):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(get_connection,), name="overdue-sweep", daemon=True)
+        self._thread.start()
+
+    def _loop(self, get_connection):
+        while True:
+            time.sleep(self.interval)
+            try:
+                conn = get_connection()
+            except Exception as e:
+                logging.error(f"Overdue sweep skipped: {str(e)}")
+                continue
+            cursor = conn.cursor(dictionary=True)
+            try:
+                self.sweep(cursor, conn)
+            except Exception as e:
+                logging.error(f"Overdue sweep failed: {str(e)}")
+            finally:
+                cursor.close()
+                conn.close()
+
+    def sweep(self, cursor, conn, action=None, batch_size=None):
+        # Returns the sweep summary, or None when another worker holds the lock
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            return None
+        try:
+            taken = start_due_reservations(cursor)
+            sweep = flag_overdue if (action or self.action) == "flag" else complete_overdue
+            result = sweep(cursor, overdue_cutoff(grace_days=self.grace_days), batch_size or self.batch_size)
+            result.cars_taken = taken
+        except Exception as e:
+            conn.rollback()
+            self.last_error = str(e)
+            raise
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s) AS released", (LOCK_NAME,))
+            cursor.fetchone()
+
+        summary = result.as_dict()
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_result = summary
+        self.last_error = None
+        if summary["rentals"] or summary["cars_taken"]:
+            logging.info(f"Overdue sweep: {summary}")
+        return summary
+
+    def state(self):
+        return {
+            "interval_seconds": self.interval,
+            "action": self.action,
+            "batch_size": self.batch_size,
+            "grace_days": self.grace_days,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+overdue_scheduler = OverdueScheduler()
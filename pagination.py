@@ -0,0 +1,148 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+# Keyset (cursor) pagination for list endpoints. Pages are addressed by the
+# ordering key of the last row served instead of an OFFSET, so every page is
+# an index range scan no matter how deep into the table it is.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_FETCH_SIZE = 500
+STREAM_FORMATS = ("ndjson", "json")
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_plain(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class Keyset:
+    # columns: [(sql_expression, row_key)] forming a unique ordering, the last
+    # one normally being the primary key as a tie-breaker
+    def __init__(self, columns, descending=False):
+        self.columns = columns
+        self.descending = descending
+
+    def order_by(self):
+        direction = "DESC" if self.descending else "ASC"
+        return ", ".join(f"{expr} {direction}" for expr, _ in self.columns)
+
+    def after(self, values):
+        # Expanded form of (a, b) > (x, y); MySQL uses the index for this shape
+        if len(values) != len(self.columns):
+            raise ValueError("Invalid cursor")
+        op = "<" if self.descending else ">"
+        clauses = []
+        params = []
+        for i, (expr, _) in enumerate(self.columns):
+            parts = [f"{prev} = %s" for prev, _ in self.columns[:i]] + [f"{expr} {op} %s"]
+            clauses.append("(" + " AND ".join(parts) + ")")
+            params.extend(values[:i + 1])
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def cursor_for(self, row):
+        return encode_cursor([row[key] for _, key in self.columns])
+
+
+class PageRequest:
+    def __init__(self, limit=DEFAULT_PAGE_SIZE, after=None, stream=None):
+        self.limit = limit
+        self.after = after
+        self.stream = stream
+
+    @classmethod
+    def from_args(cls, args):
+        # Raises ValueError on a malformed limit, cursor or format
+        try:
+            limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+        except (TypeError, ValueError):
+            raise ValueError("limit must be an integer")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        token = args.get("cursor")
+        after = decode_cursor(token) if token else None
+        stream = args.get("format")
+        if stream is not None and stream not in STREAM_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(STREAM_FORMATS)}")
+        return cls(limit, after, stream)
+
+
+def build_query(select_sql, keyset, where=None, params=(), after=None, limit=None):
+    conditions = [f"({where})"] if where else []
+    params = list(params)
+    if after is not None:
+        clause, clause_params = keyset.after(after)
+        conditions.append(clause)
+        params.extend(clause_params)
+    sql = select_sql
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY " + keyset.order_by()
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def fetch_page(cursor, select_sql, keyset, page, where=None, params=()):
+    # Returns (rows, next_cursor); one extra row is read to know if more exist
+    sql, params = build_query(select_sql, keyset, where, params, page.after, page.limit + 1)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = keyset.cursor_for(rows[-1])
+    return rows, next_cursor
+
+
+def stream_rows(get_connection, select_sql, keyset, page, dumps, where=None, params=()):
+    # Generator over the whole result as NDJSON lines or one JSON array. Uses
+    # its own connection and an unbuffered cursor because the response body is
+    # produced after the request handler (and db_connection) have returned.
+    sql, params = build_query(select_sql, keyset, where, params, page.after)
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(sql, params)
+        if page.stream == "json":
+            yield "["
+        first = True
+        while True:
+            rows = cursor.fetchmany(STREAM_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if page.stream == "ndjson":
+                    yield dumps(row) + "\n"
+                else:
+                    yield ("" if first else ",") + dumps(row)
+                first = False
+        if page.stream == "json":
+            yield "]"
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            # The client went away mid-stream, leaving rows unread
+            conn.consume_results()
+        conn.close()
@@ -0,0 +1,128 @@
+import os
+import threading
+from decimal import Decimal
+
+import numpy as np
+
+# Rental pricing. A rental's price is price_per_day times the sum of its
+# per-day factors (seasonal multiplier for the day's month, times the weekend
+# multiplier on Saturdays and Sundays), less the long-rental discount for its
+# length. The per-range multiplier is computed once and applied to the whole
+# fleet's price vector, so quoting every car for several ranges is one outer
+# product. rent_car and /rentals/batch price through the same code, so the
+# committed total always matches the quote.
+#
+# The defaults leave prices at price_per_day * days; set, for example,
+#   QUOTE_WEEKEND_MULTIPLIER=1.15
+#   QUOTE_SEASONAL_MULTIPLIERS=6:1.2,7:1.3,8:1.3,12:1.25   (month:multiplier)
+#   QUOTE_LONG_RENTAL_DISCOUNTS=7:0.1,28:0.25              (min days:fraction off)
+MAX_RANGES = 12
+MAX_DAYS = 366
+CENT = Decimal("0.01")
+
+
+def _parse_pairs(value, key_type=int):
+    pairs = {}
+    for item in value.split(","):
+        if item.strip():
+            key, factor = item.split(":")
+            pairs[key_type(key)] = float(factor)
+    return pairs
+
+
+class PricingRules:
+    def __init__(self, weekend_multiplier=1.0, seasonal_multipliers=None, long_rental_discounts=None):
+        self.weekend_multiplier = weekend_multiplier
+        # Indexed by month number; slot 0 is unused
+        self.month_factors = np.ones(13)
+        for month, factor in (seasonal_multipliers or {}).items():
+            self.month_factors[month] = factor
+        self.long_rental_discounts = sorted((long_rental_discounts or {}).items())
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            float(os.environ.get("QUOTE_WEEKEND_MULTIPLIER", 1.0)),
+            _parse_pairs(os.environ.get("QUOTE_SEASONAL_MULTIPLIERS", "")),
+            _parse_pairs(os.environ.get("QUOTE_LONG_RENTAL_DISCOUNTS", "")),
+        )
+
+    def discount(self, days):
+        fraction = 0.0
+        for min_days, off in self.long_rental_discounts:
+            if days >= min_days:
+                fraction = off
+        return fraction
+
+    def multiplier(self, start, end):
+        # Number to multiply price_per_day by for a rental over [start, end)
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+        # 1970-01-01 was a Thursday, so Monday is 0 and Saturday 5
+        weekdays = (days.astype("int64") + 3) % 7
+        months = days.astype("datetime64[M]").astype("int64") % 12 + 1
+        factors = self.month_factors[months] * np.where(weekdays >= 5, self.weekend_multiplier, 1.0)
+        return factors.sum() * (1.0 - self.discount(len(days)))
+
+
+def _money(value):
+    return Decimal(f"{value:.2f}").quantize(CENT)
+
+
+class FleetPrices:
+    # The catalogue's rows as arrays, rebuilt when the catalogue's etag changes
+    def __init__(self, entry):
+        self.etag = entry.etag
+        self.rows = entry.rows
+        self.car_ids = np.array([row['car_id'] for row in entry.rows], dtype="int64")
+        self.prices = np.array([float(row['price_per_day']) for row in entry.rows], dtype="float64")
+
+
+class QuoteEngine:
+    def __init__(self, rules=None):
+        self.rules = rules or PricingRules.from_env()
+        self._fleet = None
+        self._lock = threading.Lock()
+
+    def fleet(self, entry):
+        fleet = self._fleet
+        if fleet is None or fleet.etag != entry.etag:
+            fleet = FleetPrices(entry)
+            with self._lock:
+                self._fleet = fleet
+        return fleet
+
+    def totals(self, prices, ranges):
+        # (cars x ranges) matrix of totals, rounded to cents
+        multipliers = np.array([self.rules.multiplier(start, end) for start, end in ranges])
+        return np.round(np.outer(prices, multipliers), 2)
+
+    def price(self, price_per_day, start, end):
+        # One car, same arithmetic as the fleet quote
+        return _money(self.totals(np.array([float(price_per_day)]), [(start, end)])[0, 0])
+
+    def quote(self, entry, ranges, is_free=None):
+        # Every catalogue car priced for each range. is_free(car_id, start, end)
+        # blanks out ranges in which a car is already booked.
+        fleet = self.fleet(entry)
+        totals = self.totals(fleet.prices, ranges)
+        quotes = []
+        for i, row in enumerate(fleet.rows):
+            car_totals = []
+            for j, (start, end) in enumerate(ranges):
+                free = is_free is None or is_free(row['car_id'], start, end)
+                car_totals.append(_money(totals[i, j]) if free else None)
+            quotes.append({
+                "car_id": row['car_id'],
+                "model": row['model'],
+                "make": row['make'],
+                "price_per_day": row['price_per_day'],
+                "totals": car_totals,
+            })
+        return {
+            "ranges": [{"start": start.isoformat(), "end": end.isoformat(), "days": (end - start).days}
+                       for start, end in ranges],
+            "quotes": quotes,
+        }
+
+
+quote_engine = QuoteEngine()
@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import date
+from decimal import Decimal
+
+from availability import parse_date
+
+# Streaming export of rental history for finance. Rentals are joined with
+# their customer, car and payments and read through an unbuffered cursor in
+# FETCH_SIZE batches, written out as CSV or NDJSON and optionally gzipped on
+# the fly, so memory stays flat however many rows match. A rental with
+# several payments appears once per payment; one without any appears once
+# with empty payment columns.
+EXPORT_SQL = """
+    SELECT r.rental_id, r.customer_id, c.first_name, c.last_name, c.email,
+           r.car_id, cars.make, cars.model, cars.registration_number,
+           r.start_date, r.end_date, r.status, r.total_cost,
+           p.payment_id, p.amount AS payment_amount, p.payment_date, p.payment_method
+    FROM Rentals r
+    JOIN Customers c ON r.customer_id = c.customer_id
+    JOIN Cars cars ON r.car_id = cars.car_id
+    LEFT JOIN Payments p ON p.rental_id = r.rental_id
+"""
+STATUSES = ("Ongoing", "Completed", "Cancelled")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+FETCH_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+
+def _plain(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class ExportRequest:
+    def __init__(self, fmt="csv", since=None, until=None, statuses=None, gzip=False):
+        self.format = fmt
+        self.since = since
+        self.until = until
+        self.statuses = statuses or []
+        self.gzip = gzip
+
+    @classmethod
+    def from_args(cls, args):
+        # ?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD&status=Completed,Cancelled&gzip=1
+        # The date range applies to start_date and includes both ends.
+        fmt = args.get("format", "csv")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        since = parse_date(args["from"]) if args.get("from") else None
+        until = parse_date(args["to"]) if args.get("to") else None
+        if since and until and until < since:
+            raise ValueError("Invalid date range")
+        statuses = [status.strip() for status in args.get("status", "").split(",") if status.strip()]
+        for status in statuses:
+            if status not in STATUSES:
+                raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+        return cls(fmt, since, until, statuses, args.get("gzip") == "1")
+
+    def query(self):
+        where, params = [], []
+        if self.statuses:
+            where.append(f"r.status IN ({', '.join(['%s'] * len(self.statuses))})")
+            params.extend(self.statuses)
+        if self.since:
+            where.append("r.start_date >= %s")
+            params.append(self.since)
+        if self.until:
+            where.append("r.start_date <= %s")
+            params.append(self.until)
+        sql = EXPORT_SQL
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + " ORDER BY r.start_date, r.rental_id, p.payment_id", params
+
+    @property
+    def mimetype(self):
+        return "application/gzip" if self.gzip else FORMATS[self.format]
+
+    @property
+    def filename(self):
+        name = f"rentals.{self.format}"
+        return name + ".gz" if self.gzip else name
+
+
+def _encoded_lines(cursor, export):
+    # Yields text chunks of roughly FLUSH_BYTES
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export.format == "csv" else None
+    columns = cursor.column_names
+    if writer:
+        writer.writerow(columns)
+
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            values = [_plain(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values))) + "\n")
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(conn, export):
+    # Generator of response body bytes. Owns `conn` and closes it when the
+    # export finishes or the client disconnects.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if export.gzip else None
+    cursor = conn.cursor(buffered=False)
+    try:
+        sql, params = export.query()
+        cursor.execute(sql, params)
+        for chunk in _encoded_lines(cursor, export):
+            data = chunk.encode("utf-8")
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    except Exception as e:
+        logging.error(f"Rental export failed: {str(e)}")
+        raise
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            # The client went away mid-stream, leaving rows unread
+            conn.consume_results()
+        conn.close()
@@ -0,0 +1,139 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Dashboard statistics maintained incrementally by the rental and car write
+# paths instead of being aggregated on every /admin/statistics load. Other
+# workers' writes and anything the hooks cannot account for (car edits,
+# cascading deletes) are folded in by a periodic reconciliation against the
+# tables, which also rebuilds the daily revenue rollup. Revenue is bucketed by
+# the rental's end_date.
+RECONCILE_SECONDS = float(os.environ.get("STATS_RECONCILE_SECONDS", 300))
+POPULAR_CARS = 5
+
+
+class RentalStats:
+    def __init__(self, reconcile_seconds=RECONCILE_SECONDS):
+        self.reconcile_seconds = reconcile_seconds
+        self.total_revenue = Decimal(0)
+        self.active_rentals = 0
+        self.available_cars = 0
+        self._cars = {}  # car_id -> [model, rental_count]
+        self._daily_revenue = {}  # date -> Decimal
+        self._reconciled_at = None
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def is_due(self):
+        if self._dirty or self._reconciled_at is None:
+            return True
+        return time.monotonic() - self._reconciled_at > self.reconcile_seconds
+
+    def reconcile(self, cursor):
+        started = time.perf_counter()
+        cursor.execute("SELECT COALESCE(SUM(total_cost), 0) as total_revenue FROM Rentals WHERE status = 'Completed'")
+        revenue = Decimal(cursor.fetchone()['total_revenue'])
+
+        cursor.execute("SELECT COUNT(*) as active_rentals FROM Rentals WHERE status = 'Ongoing'")
+        active_rentals = cursor.fetchone()['active_rentals']
+
+        cursor.execute("SELECT COUNT(*) as available_cars FROM Cars WHERE status = 'Available'")
+        available_cars = cursor.fetchone()['available_cars']
+
+        cursor.execute("""
+            SELECT c.car_id, c.model, COUNT(r.rental_id) as rental_count
+            FROM Cars c
+            LEFT JOIN Rentals r ON c.car_id = r.car_id
+            GROUP BY c.car_id, c.model
+        """)
+        cars = {row['car_id']: [row['model'], row['rental_count']] for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT end_date as day, SUM(total_cost) as revenue
+            FROM Rentals
+            WHERE status = 'Completed'
+            GROUP BY end_date
+        """)
+        daily_revenue = {row['day']: Decimal(row['revenue']) for row in cursor.fetchall()}
+
+        with self._lock:
+            self.total_revenue = revenue
+            self.active_rentals = active_rentals
+            self.available_cars = available_cars
+            self._cars = cars
+            self._daily_revenue = daily_revenue
+            self._reconciled_at = time.monotonic()
+            self._dirty = False
+        logging.info(f"Statistics reconciled in {time.perf_counter() - started:.3f}s")
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    # Write path hooks, called after the corresponding transaction commits
+    def rental_started(self, car_id, car_taken):
+        with self._lock:
+            self.active_rentals += 1
+            if car_taken:
+                self.available_cars -= 1
+            car = self._cars.get(car_id)
+            if car is None:
+                self._dirty = True
+            else:
+                car[1] += 1
+
+    def rentals_completed(self, rentals, cars_released):
+        # Rentals completed through overdue.complete_rentals, as
+        # (total_cost, end_date) pairs
+        with self._lock:
+            self.active_rentals -= len(rentals)
+            self.available_cars += cars_released
+            for total_cost, end_date in rentals:
+                amount = Decimal(total_cost or 0)
+                self.total_revenue += amount
+                self._daily_revenue[end_date] = self._daily_revenue.get(end_date, Decimal(0)) + amount
+
+    def cars_taken(self, count):
+        # Reservations whose start date arrived (overdue.start_due_reservations)
+        with self._lock:
+            self.available_cars -= count
+
+    def rental_cancelled(self, car_released):
+        with self._lock:
+            self.active_rentals -= 1
+            if car_released:
+                self.available_cars += 1
+
+    def car_added(self, car_id, model, status):
+        with self._lock:
+            self._cars[car_id] = [model, 0]
+            if status == 'Available':
+                self.available_cars += 1
+
+    def snapshot(self):
+        with self._lock:
+            popular = heapq.nlargest(POPULAR_CARS, self._cars.values(), key=lambda car: car[1])
+            return {
+                "total_revenue": self.total_revenue,
+                "active_rentals": self.active_rentals,
+                "available_cars": self.available_cars,
+                "popular_cars": [{"model": model, "rental_count": count} for model, count in popular],
+            }
+
+    def revenue_series(self, granularity="daily", days=30):
+        # [{"period": ..., "revenue": ...}] oldest first, covering the last `days`
+        since = date.today() - timedelta(days=days)
+        buckets = {}
+        with self._lock:
+            for day, revenue in self._daily_revenue.items():
+                if day is None or day < since:
+                    continue
+                period = day.strftime("%Y-%m") if granularity == "monthly" else day.isoformat()
+                buckets[period] = buckets.get(period, Decimal(0)) + revenue
+        return [{"period": period, "revenue": buckets[period]} for period in sorted(buckets)]
+
+
+rental_stats = RentalStats()
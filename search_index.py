@@ -0,0 +1,293 @@
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+# In-process search index for /admin/search. Each entity keeps a token ->
+# document inverted index, a sorted vocabulary for prefix matches and a
+# deletion-neighbourhood index (every term under each single-character
+# deletion) that finds terms one typo away, transpositions included. Queries
+# are answered without touching the database; only the matching rows are
+# fetched by primary key afterwards.
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+FUZZY_MIN_LENGTH = 4
+MAX_EXPANSIONS = 50
+# New rows written by other workers are picked up by id every SYNC_SECONDS;
+# edits and deletes they make are picked up by the full rebuild
+SYNC_SECONDS = float(os.environ.get("SEARCH_SYNC_SECONDS", 30))
+REBUILD_SECONDS = float(os.environ.get("SEARCH_REBUILD_SECONDS", 3600))
+LOAD_FETCH_SIZE = 5000
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    if text is None:
+        return []
+    return _TOKEN.findall(str(text).lower())
+
+
+def _fuzzy_keys(term):
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _fuzzy_eligible(term):
+    # Short tokens would match half the vocabulary, and nobody misspells the
+    # digits in "smith1987"
+    return len(term) >= FUZZY_MIN_LENGTH and term.isalpha()
+
+
+class TextIndex:
+    def __init__(self, fields):
+        self.fields = fields
+        self._postings = {}
+        self._docs = {}
+        self._variants = {}
+        self._terms = []
+        self._max_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def max_id(self):
+        return self._max_id
+
+    def _tokens(self, row):
+        tokens = set()
+        for field in self.fields:
+            tokens.update(tokenize(row.get(field)))
+        return tokens
+
+    def _add_term(self, term, bulk):
+        self._postings[term] = set()
+        if _fuzzy_eligible(term):
+            for key in _fuzzy_keys(term):
+                self._variants.setdefault(key, set()).add(term)
+        if bulk:
+            self._terms.append(term)
+        else:
+            insort(self._terms, term)
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        if _fuzzy_eligible(term):
+            for key in _fuzzy_keys(term):
+                terms = self._variants.get(key)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._variants[key]
+        pos = bisect_left(self._terms, term)
+        if pos < len(self._terms) and self._terms[pos] == term:
+            self._terms.pop(pos)
+
+    def add(self, doc_id, row, bulk=False):
+        tokens = self._tokens(row)
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = tuple(tokens)
+            self._max_id = max(self._max_id, doc_id)
+            for token in tokens:
+                if token not in self._postings:
+                    self._add_term(token, bulk)
+                self._postings[token].add(doc_id)
+
+    def finish_bulk(self):
+        with self._lock:
+            self._terms.sort()
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        for token in self._docs.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.discard(doc_id)
+            if not postings:
+                self._drop_term(token)
+
+    def _tiers(self, token, fuzzy):
+        # [(weight, docs)] for the ways `token` can match, best first
+        tiers = []
+        if token in self._postings:
+            tiers.append((1.0, self._postings[token]))
+
+        if len(token) >= 2:
+            prefixed = []
+            pos = bisect_left(self._terms, token)
+            while pos < len(self._terms) and len(prefixed) < MAX_EXPANSIONS:
+                term = self._terms[pos]
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    prefixed.append(self._postings[term])
+                pos += 1
+            if prefixed:
+                tiers.append((PREFIX_WEIGHT, set().union(*prefixed)))
+
+        if fuzzy and _fuzzy_eligible(token):
+            similar = set()
+            for key in _fuzzy_keys(token):
+                similar.update(self._variants.get(key, ()))
+            similar.discard(token)
+            similar = [term for term in similar if not term.startswith(token)][:MAX_EXPANSIONS]
+            if similar:
+                tiers.append((FUZZY_WEIGHT, set().union(*(self._postings[term] for term in similar))))
+        return tiers
+
+    def _search(self, tokens, limit, fuzzy):
+        per_token = [self._tiers(token, fuzzy) for token in tokens]
+        if not all(per_token):
+            return []
+
+        if len(per_token) == 1:
+            # Rank tier by tier; ties go to the lowest id
+            ranked = []
+            seen = set()
+            for weight, docs in per_token[0]:
+                fresh = docs - seen
+                ranked.extend((doc_id, weight) for doc_id in heapq.nsmallest(limit - len(ranked), fresh))
+                if len(ranked) >= limit:
+                    break
+                seen |= fresh
+            return ranked
+
+        # Every token has to match; intersect with set operations first and
+        # only score the surviving documents
+        matches = [set().union(*(docs for _, docs in tiers)) for tiers in per_token]
+        matches.sort(key=len)
+        candidates = matches[0].intersection(*matches[1:])
+        scored = []
+        for doc_id in candidates:
+            score = 0.0
+            for tiers in per_token:
+                score += next(weight for weight, docs in tiers if doc_id in docs)
+            scored.append((doc_id, score))
+        return heapq.nlargest(limit, scored, key=lambda item: (item[1], -item[0]))
+
+    def search(self, query, limit=50):
+        # [(doc_id, score)] best first. Typo matching only kicks in when the
+        # exact and prefix matches do not fill the page.
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            hits = self._search(tokens, limit, fuzzy=False)
+            if len(hits) < limit:
+                hits = self._search(tokens, limit, fuzzy=True)
+        return hits
+
+
+class SearchIndexes:
+    CUSTOMER_FIELDS = ("first_name", "last_name", "email")
+    CAR_FIELDS = ("model", "make", "status", "registration_number")
+
+    def __init__(self, sync_seconds=SYNC_SECONDS, rebuild_seconds=REBUILD_SECONDS):
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.customers = TextIndex(self.CUSTOMER_FIELDS)
+        self.cars = TextIndex(self.CAR_FIELDS)
+        self.ready = False
+        self._built_at = None
+        self._synced_at = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, get_connection):
+        # Starts a background (re)build when due; searches fall back to SQL
+        # until the first build has finished
+        with self._lock:
+            due = self._built_at is None or time.monotonic() - self._built_at > self.rebuild_seconds
+            if self._building or not due:
+                return
+            self._building = True
+        threading.Thread(target=self._build, args=(get_connection,), name="search-index", daemon=True).start()
+
+    def _load(self, conn, index, sql):
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(sql)
+            key = cursor.column_names[0]
+            while True:
+                rows = cursor.fetchmany(LOAD_FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    index.add(row[key], row, bulk=True)
+        finally:
+            cursor.close()
+        index.finish_bulk()
+
+    def _build(self, get_connection):
+        started = time.perf_counter()
+        try:
+            customers = TextIndex(self.CUSTOMER_FIELDS)
+            cars = TextIndex(self.CAR_FIELDS)
+            conn = get_connection()
+            try:
+                self._load(conn, customers, "SELECT customer_id, first_name, last_name, email FROM Customers")
+                self._load(conn, cars, "SELECT car_id, model, make, status, registration_number FROM Cars")
+            finally:
+                conn.close()
+            self.customers, self.cars = customers, cars
+            self._built_at = self._synced_at = time.monotonic()
+            self.ready = True
+            logging.info(f"Search index built in {time.perf_counter() - started:.2f}s "
+                         f"({len(customers)} customers, {len(cars)} cars)")
+        except Exception as e:
+            logging.error(f"Search index build failed: {str(e)}")
+        finally:
+            self._building = False
+
+    def sync(self, cursor):
+        # Cheap catch-up on rows inserted by other workers since the last sync
+        if not self.ready or time.monotonic() - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = time.monotonic()
+        cursor.execute("SELECT customer_id, first_name, last_name, email FROM Customers WHERE customer_id > %s",
+                       (self.customers.max_id(),))
+        for row in cursor.fetchall():
+            self.customers.add(row['customer_id'], row)
+        cursor.execute("SELECT car_id, model, make, status, registration_number FROM Cars WHERE car_id > %s",
+                       (self.cars.max_id(),))
+        for row in cursor.fetchall():
+            self.cars.add(row['car_id'], row)
+
+    # Write paths call these after committing so the index stays current
+    def reindex_customer(self, cursor, customer_id):
+        if not self.ready:
+            return
+        cursor.execute("SELECT customer_id, first_name, last_name, email FROM Customers WHERE customer_id = %s",
+                       (customer_id,))
+        row = cursor.fetchone()
+        if row:
+            self.customers.add(row['customer_id'], row)
+
+    def reindex_car(self, cursor, car_id):
+        # DELETE /admin/cars passes car_id straight from the query string
+        if not self.ready or car_id is None:
+            return
+        cursor.execute("SELECT car_id, model, make, status, registration_number FROM Cars WHERE car_id = %s",
+                       (car_id,))
+        row = cursor.fetchone()
+        if row:
+            self.cars.add(row['car_id'], row)
+        else:
+            self.cars.remove(int(car_id))
+
+    def invalidate(self):
+        # Rebuild on the next search, e.g. after a bulk import rewrote rows
+        with self._lock:
+            self._built_at = None
+
+    def stats(self):
+        return {"ready": self.ready, "customers": len(self.customers), "cars": len(self.cars)}
+
+
+search_indexes = SearchIndexes()
@@ -0,0 +1,46 @@
+import os
+
+# Database settings shared by the app and the command line tools. Each value
+# can be overridden from the environment.
+DB_SETTINGS = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "port": int(os.environ.get("DB_PORT", 3306)),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", "12345"),
+    "database": os.environ.get("DB_NAME", "car_rental"),
+}
+
+# Connection pool used by the web app (see db_pool.py). Times are in seconds;
+# 0 disables max_uses, max_idle and max_lifetime.
+POOL_SETTINGS = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+    "max_uses": int(os.environ.get("DB_POOL_MAX_USES", 1000)),
+    "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+    "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 3600)),
+    "health_check_after": float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30)),
+}
+
+# Optional read replica for the read-only routes (see db_routing.py). Without
+# DB_REPLICA_HOST everything runs on the primary; the other DB_REPLICA_*
+# connection values default to the primary's. The replica pool is sized by
+# POOL_SETTINGS too.
+REPLICA_DB_SETTINGS = None
+if os.environ.get("DB_REPLICA_HOST"):
+    REPLICA_DB_SETTINGS = {
+        **DB_SETTINGS,
+        "host": os.environ["DB_REPLICA_HOST"],
+        "port": int(os.environ.get("DB_REPLICA_PORT", DB_SETTINGS["port"])),
+        "user": os.environ.get("DB_REPLICA_USER", DB_SETTINGS["user"]),
+        "password": os.environ.get("DB_REPLICA_PASSWORD", DB_SETTINGS["password"]),
+    }
+
+# Times in seconds. Leaving DB_REPLICA_STICKY_SECONDS unset derives it from
+# the other two.
+ROUTING_SETTINGS = {
+    "max_lag": float(os.environ.get("DB_REPLICA_MAX_LAG", 5)),
+    "lag_check_interval": float(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", 2)),
+    "checkout_timeout": float(os.environ.get("DB_REPLICA_CHECKOUT_TIMEOUT", 0.5)),
+    "sticky_seconds": float(os.environ["DB_REPLICA_STICKY_SECONDS"]) if os.environ.get("DB_REPLICA_STICKY_SECONDS") else None,
+}